@@ -18,6 +18,93 @@ class Settings(BaseSettings):
     # Infra
     REDIS_URL: str = "redis://localhost:6379"
     QDRANT_URL: str = "http://localhost:6333"
+    QDRANT_QUANTIZATION: bool = False  # int8 scalar quantization with rescoring
+    QDRANT_ON_DISK: bool = False  # Keep original float32 vectors on disk (mmap)
+
+    # RAG
+    VECTOR_BACKEND: str = "qdrant"  # "qdrant" | "numpy" (embedded, single node)
+    VECTOR_STORE_DIR: str = "data/vectors"  # Used by the numpy backend
+    VECTOR_COMPACT_RATIO: float = 0.3  # numpy backend: rewrite the files once this share of rows is deleted
+    EMBEDDING_MODEL: str = "BAAI/bge-small-en-v1.5"
+    EMBEDDING_SERVER_URL: str | None = None  # e.g. unix:///tmp/fortitwin-embed.sock or http://127.0.0.1:8100
+    RAG_EMBED_THREADS: int = 2  # Executor threads running the ONNX embedder
+    RAG_MAX_CONCURRENCY: int = 8  # Max in-flight RAG calls per process
+    RAG_QUERY_CACHE_SIZE: int = 1024  # Query embeddings kept per process
+    RAG_QUERY_CACHE_REDIS: bool = False  # Share query embeddings across workers
+    RAG_QUERY_CACHE_TTL: int = 86400
+    RAG_BATCHING: bool = True  # Coalesce concurrent embedding calls
+    RAG_BATCH_MAX_SIZE: int = 256
+    RAG_BATCH_MAX_WAIT_MS: float = 5.0
+    RAG_CHUNK_CACHE_PATH: str = "data/chunk_embeddings.sqlite3"  # Shared by API + workers on a node
+    RAG_CHUNK_CACHE_MAX_ROWS: int = 100_000  # ~150 MB of 384-dim vectors; least recently used go first
+    KB_MANIFEST_PATH: str = "data/kb_manifest.json"  # File fingerprints for incremental KB ingest
+    RAG_OVERFETCH: int = 4  # Candidates fetched per requested hit, re-ranked with MMR
+    RAG_MMR_LAMBDA: float = 0.7  # 1.0 = pure relevance, lower = more diversity
+    RAG_CONTEXT_TOKENS: int = 400  # Token budget for an assembled retrieval context
+    LLM_CONTEXT_TOKENS: int = 400  # Cap on background context sent with a chat turn
+    TIKTOKEN_CACHE_DIR: str = "data/tiktoken"  # Pre-seed it in images that run offline
+
+    # LLM
+    LLM_TIMEOUT: float = 10.0  # Per-call ceiling; a timeout counts as a provider failure
+    LLM_SCORING_TIMEOUT: float = 60.0
+    LLM_STREAM_CHUNK_TIMEOUT: float = 5.0  # Longest gap between streamed chunks before the stream counts as stalled
+    LLM_STREAM_TIMEOUT: float = 30.0  # Ceiling on a whole streamed turn
+    LLM_SCORING_SEGMENT_TOKENS: int = 2000  # Longer transcripts are scored per segment, then combined
+    LLM_SCORING_CONCURRENCY: int = 4  # Segments of one interview scored at the same time
+    LLM_SCORING_BULK_CONCURRENCY: int = 8  # Interviews scored at once by /interview/score/bulk
+    LLM_SCORING_BULK_MAX: int = 200  # Session ids accepted per bulk request
+    LLM_RATE_GROQ_RPM: int = 0  # Request quota per minute, per model (0 = unlimited)
+    LLM_RATE_OPENAI_RPM: int = 0
+    LLM_RATE_BURST: int = 5  # Requests a model may take at once before pacing starts
+    LLM_RATE_LIVE_RESERVE: int = 1  # Tokens background calls must leave for live turns
+    LLM_RATE_REDIS: bool = True  # Share buckets across API + worker processes via Redis
+    LLM_HEDGING: bool = True  # Fire the next provider if the first is slower than its p95
+    LLM_HEDGE_DEFAULT_DELAY: float = 1.5  # Hedge deadline until a model has a trusted p95 (seconds)
+    LLM_HEDGE_MIN_DELAY: float = 0.25  # Never hedge sooner than this
+    LLM_BREAKER_FAILURES: int = 3  # Consecutive failures that open a provider's circuit
+    LLM_BREAKER_RESET: float = 30.0  # Seconds before an open circuit lets a probe through
+    LLM_SLO_VOICE_TURN: float = 0.8  # p95 budget to first streamed text (seconds)
+    LLM_SLO_TEXT_TURN: float = 2.5  # p95 budget for a full interview turn
+    LLM_SLO_SCORING: float = 30.0
+    LLM_SLO_SCORING_SEGMENT: float = 10.0  # One map step of a long interview
+    LLM_SLO_SUMMARY: float = 5.0  # Background, so only needs to keep up with turns
+    LLM_ROUTING_WINDOW: float = 300.0  # Seconds of latency/error history used for routing
+    LLM_ROUTING_MIN_SAMPLES: int = 10  # Below this a model counts as healthy (lets it recover)
+    LLM_ROUTING_MAX_ERROR_RATE: float = 0.2
+    LLM_CACHE: bool = False  # Opt-in response cache for repeatable calls
+    LLM_CACHE_CALL_TYPES: str = "opening"  # Comma-separated; scoring is never cached
+    LLM_CACHE_SIZE: int = 1024
+    LLM_CACHE_TTL: int = 3600
+    LLM_CACHE_REDIS: bool = False  # Share cached responses across workers
+    LLM_CACHE_SEMANTIC: bool = False  # Also match near-identical prompts by embedding
+    LLM_CACHE_SIMILARITY: float = 0.97
+
+    # Conversation memory
+    MEMORY_RECENT_ENTRIES: int = 6  # Transcript entries sent verbatim (3 Q/A pairs)
+    MEMORY_SUMMARY_TOKENS: int = 200  # Cap on the running summary
+
+    # Voice
+    VOICE_STREAMING: bool = True  # Stream LLM turns to Hume sentence by sentence
+    VOICE_MIN_CHUNK_CHARS: int = 20  # Shorter sentences are merged with the next one
+    VOICE_SPECULATION: bool = True  # Pre-generate replies from stable partial transcripts
+    VOICE_SPECULATION_STABLE_MS: float = 300.0  # Partial must be unchanged this long
+    VOICE_SPECULATION_MIN_CHARS: int = 40  # Don't speculate on very short answers
+    VOICE_SPECULATION_SIMILARITY: float = 0.9  # Final vs partial ratio needed to reuse
+
+    # Uploads
+    BLOB_DIR: str = "data/blobs"  # Must be shared by the API and workers
+    MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    MAX_UPLOAD_OVERHEAD: int = 64 * 1024  # Multipart framing + form fields on top of the file
+
+    # Worker
+    WORKER_MAX_JOBS: int = 16  # Jobs are mostly I/O-bound once PDFs go to the pool
+    WORKER_JOB_TIMEOUT: int = 120
+    WORKER_SCORING_TIMEOUT: int = 1800  # Map-reduce scoring may queue for background quota
+    WORKER_HTTP_MAX_CONNECTIONS: int = 20
+    WORKER_PDF_PROCESSES: int | None = None  # None = one per core
+    PDF_MAX_PAGES: int = 20
+    PDF_PAGES_PER_TASK: int = 4
+    PDF_EXTRACT_TIMEOUT: float = 30.0
 
     class Config:
         env_file = ".env"
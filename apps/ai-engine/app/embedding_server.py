@@ -0,0 +1,70 @@
+import argparse
+import logging
+from contextlib import asynccontextmanager
+from typing import List
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Response
+from pydantic import BaseModel
+
+from app.core.config import get_settings
+from app.services.embeddings import LocalEmbedder
+
+# -------------------------------------------------------------------
+# Shared embedding server
+# One model copy per node: API workers and ARQ workers point
+# EMBEDDING_SERVER_URL here instead of each loading bge-small.
+# Requests from all clients are coalesced by the micro-batcher.
+# -------------------------------------------------------------------
+settings = get_settings()
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("fortitwin.embedding_server")
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.embedder = LocalEmbedder()
+    await app.state.embedder.embed(["warmup"])
+    logger.info(f"✅ Embedding server ready ({settings.EMBEDDING_MODEL})")
+
+    yield
+
+    await app.state.embedder.close()
+    logger.info("🛑 Embedding server stopped")
+
+
+app = FastAPI(title="FortiTwin Embedding Server", lifespan=lifespan)
+
+
+@app.post("/embed")
+async def embed(req: EmbedRequest):
+    vectors = await app.state.embedder.embed(req.texts)
+    matrix = np.asarray(vectors, dtype=np.float32)
+    dim = matrix.shape[1] if matrix.ndim == 2 else 0
+    return Response(
+        content=matrix.tobytes(),
+        media_type="application/octet-stream",
+        headers={"X-Embedding-Dim": str(dim)},
+    )
+
+
+@app.get("/health")
+async def health():
+    return {"status": "operational", **app.state.embedder.stats()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uds", type=str, help="Unix socket path (e.g. /tmp/fortitwin-embed.sock)")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+    if args.uds:
+        uvicorn.run(app, uds=args.uds)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
@@ -8,9 +8,13 @@ import random
 from groq import Groq
 from .emotion_engine import MockEmotionProvider, HumeEmotionProvider
 from .security_events import normalize_event
+from .services.context import trim_context
 
 logger = logging.getLogger("fortitwin")
 
+# Resume context kept in a question prompt (whole chunks only)
+QUESTION_CONTEXT_TOKENS = 150
+
 # -------------------------------------------------------------------
 # Personality presets
 # -------------------------------------------------------------------
@@ -139,8 +143,8 @@ class InterviewEngine:
         ]
         
         if rag_context:
-            # Truncate context to focus LLM
-            user_parts.append(f"Context: {rag_context[:500]}...")
+            # Trim context to focus LLM, dropping whole chunks rather than cutting one
+            user_parts.append(f"Context: {trim_context(rag_context, QUESTION_CONTEXT_TOKENS)}")
             
         if prev_answer:
             user_parts.append(f"Candidate said: '{prev_answer}'")
@@ -1,3 +1,5 @@
+import asyncio
+import json
 import logging
 from contextlib import asynccontextmanager
 
@@ -11,10 +13,13 @@ from fastapi import (
     WebSocketDisconnect,
 )
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 
 # --- ARQ (Queue) ---
 from arq import create_pool
 from arq.connections import RedisSettings
+from arq.constants import result_key_prefix
+from arq.jobs import Job, JobStatus
 
 from app.core.config import get_settings
 from app.models import (
@@ -24,11 +29,19 @@ from app.models import (
     NextQuestionResponse,
     ScoreRequest,
     ScoreResponse,
+    BulkScoreRequest,
+    CandidateProfile,
     SESSION_STORE,
+    PROFILE_STORE,
+    SCORE_STORE,
+    transcript_hash,
 )
 from app.services.gateway import gateway
 from app.services.websocket import ws_manager
 from app.services.rag_service import rag
+from app.services.context import load_tokenizer
+from app.services.blob_store import blob_store, BlobTooLarge, UploadSizeLimit
+from app.services.memory import memory
 
 # -------------------------------------------------------------------
 # Setup
@@ -48,11 +61,17 @@ async def lifespan(app: FastAPI):
     )
     logger.info("✅ Redis Job Queue Connected")
 
+    # Load the embedding model and tokenizer before the first request needs them
+    await rag.warmup()
+    await load_tokenizer()
+
     yield
 
     # Cleanup
     await app.state.arq_pool.close()
     logger.info("🛑 Redis Job Queue Closed")
+    await rag.close()
+    await gateway.close()
 
 
 app = FastAPI(
@@ -70,9 +89,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Bound what the server receives, not just what it stores
+app.add_middleware(
+    UploadSizeLimit,
+    paths=["/api/parse-resume"],
+    max_bytes=settings.MAX_UPLOAD_BYTES + settings.MAX_UPLOAD_OVERHEAD,
+)
+
 # -------------------------------------------------------------------
 # 1. ASYNC JOB SUBMISSION (QUEUE / MUSCLE)
 # -------------------------------------------------------------------
+IN_FLIGHT = (JobStatus.deferred, JobStatus.queued, JobStatus.in_progress)
+
+
+async def enqueue_once(function: str, job_id: str, **kwargs) -> bool:
+    """
+    Enqueues under a deterministic job id unless that job is still queued or
+    running (returns False). ARQ also refuses an id while the finished job's
+    result is kept (an hour by default); that result is dropped so a
+    resubmission or a retry after a failure runs again.
+    """
+    pool = app.state.arq_pool
+    try:
+        if await pool.enqueue_job(function, _job_id=job_id, **kwargs) is not None:
+            return True
+        if await Job(job_id, pool).status() in IN_FLIGHT:
+            return False
+        await pool.delete(result_key_prefix + job_id)
+        return await pool.enqueue_job(function, _job_id=job_id, **kwargs) is not None
+    except Exception as e:
+        logger.error(f"❌ Enqueue failed for {job_id}: {e}")
+        raise HTTPException(status_code=503, detail="Job queue unavailable")
+
+
 @app.post("/api/parse-resume")
 async def parse_resume(
     file: UploadFile = File(...),
@@ -83,36 +132,85 @@ async def parse_resume(
     """
     logger.info(f"📥 Queue resume | candidate={candidate_id}")
 
-    content = await file.read()
+    # Stream to the blob store; only the digest travels through Redis
+    try:
+        blob = await blob_store.save_upload(file)
+    except BlobTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
     # Enqueue background job (worker handles parsing + RAG ingestion)
-    job = await app.state.arq_pool.enqueue_job(
-        "parse_and_ingest_resume",
-        file_content=content,
-        filename=file.filename,
-        candidate_id=candidate_id,
-    )
+    # Deterministic job id: client retries of the same file collapse into one
+    # in-flight job; a finished one (e.g. A -> B -> A, or a failure) runs again
+    # and the worker's has_document check skips work that is already indexed.
+    job_id = f"resume:{candidate_id}:{blob.digest}"
+    blob_store.attach(blob, job_id)
+    try:
+        queued = await enqueue_once(
+            "parse_and_ingest_resume",
+            job_id,
+            blob_digest=blob.digest,
+            filename=file.filename,
+            candidate_id=candidate_id,
+        )
+    except HTTPException:
+        # No job will ever release this link
+        blob_store.release(blob.digest, job_id)
+        raise
+
+    if not queued:
+        return {
+            "status": "duplicate",
+            "message": "Resume already queued or processing.",
+            "job_id": job_id,
+        }
 
     return {
         "status": "processing",
         "message": "Resume uploaded. Processing in background.",
-        "job_id": job.job_id,
+        "job_id": job_id,
     }
 
 
 # -------------------------------------------------------------------
 # 2. INTERVIEW LOGIC (RAG + GATEWAY)
 # -------------------------------------------------------------------
-@app.post("/interview/start", response_model=StartInterviewResponse)
-async def start_interview(req: StartInterviewRequest):
-    logger.info(f"🚀 Start interview | session={req.session_id}")
+async def candidate_context(req: StartInterviewRequest) -> str:
+    """
+    Interview context for a candidate.
+    Fast path: the profile the worker precomputed from the resume (one Mongo read).
+    Fallback: a live RAG search when no profile exists yet.
+    """
+    doc = await PROFILE_STORE.get(req.candidate_id)
+    context = CandidateProfile(**doc["profile"]).to_context() if doc else ""
+    if context:
+        if req.rag_query:
+            # An explicit question still needs the resume text behind it
+            extra = await rag.search(req.rag_query, candidate_id=req.candidate_id)
+            context = "\n---\n".join(c for c in (context, extra) if c)
+        return context
 
     # RAG search for candidate background
-    context = await rag.search(
-        query=f"{req.job_title} experience skills",
+    # Several angles on the resume in one batched embedding + search round trip
+    queries = [
+        f"{req.job_title} experience skills",
+        "technical skills, languages and tools",
+        "most recent role and responsibilities",
+        "projects and measurable achievements",
+    ]
+    if req.rag_query:
+        queries.append(req.rag_query)
+    return await rag.search_batch(
+        queries=queries,
         candidate_id=req.candidate_id,
     )
 
+
+@app.post("/interview/start", response_model=StartInterviewResponse)
+async def start_interview(req: StartInterviewRequest):
+    logger.info(f"🚀 Start interview | session={req.session_id}")
+
+    context = await candidate_context(req)
+
     await SESSION_STORE.init_session(
         session_id=req.session_id,
         candidate_id=req.candidate_id,
@@ -128,6 +226,7 @@ async def start_interview(req: StartInterviewRequest):
         company=req.company,
         history=[],
         context=context,
+        call_type="opening",
     )
 
     await SESSION_STORE.add_transcript(
@@ -158,7 +257,8 @@ async def next_question(req: NextQuestionRequest):
     ai_response = await gateway.generate_response(
         job_title=sess["job_title"],
         company=sess["company"],
-        history=[{"role": "user", "content": req.candidate_answer}],
+        # Bounded memory: running summary + last few turns + this answer
+        history=memory.history(req.session_id, sess, req.candidate_answer),
         context=context,
         emotion_data=sess.get("emotion_context", {}),
     )
@@ -167,6 +267,12 @@ async def next_question(req: NextQuestionRequest):
         req.session_id, "interviewer", ai_response.response_text
     )
 
+    # Fold older turns into the running summary, off the request path
+    memory.schedule_update(req.session_id, sess.get("transcript", []) + [
+        {"role": "candidate", "text": req.candidate_answer},
+        {"role": "interviewer", "text": ai_response.response_text},
+    ])
+
     return NextQuestionResponse(
         session_id=req.session_id,
         question=ai_response.response_text,
@@ -179,22 +285,150 @@ async def next_question(req: NextQuestionRequest):
 # -------------------------------------------------------------------
 @app.post("/interview/score", response_model=ScoreResponse)
 async def score_interview(req: ScoreRequest):
+    """
+    Cached score -> return it; otherwise enqueue a scoring job and return its id.
+    Poll GET /interview/score/{job_id} for the result.
+    """
     try:
         sess = await SESSION_STORE.get_session(req.session_id)
     except KeyError:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    evaluation = await gateway.evaluate_interview(
-        transcript=sess.get("transcript", []),
-        job_title=sess["job_title"],
+    t_hash = transcript_hash(sess.get("transcript", []))
+    cached = await SCORE_STORE.get(req.session_id, t_hash)
+    if cached:
+        return ScoreResponse(
+            session_id=req.session_id,
+            transcript_hash=t_hash,
+            scores=cached["scores"],
+        )
+
+    # Deterministic job id: repeated clicks on an unchanged transcript collapse
+    # into one in-flight job; a failed earlier run is replaced by a new one.
+    job_id = f"score:{req.session_id}:{t_hash}"
+    queued = await enqueue_once(
+        "score_interview",
+        job_id,
+        session_id=req.session_id,
+        t_hash=t_hash,
     )
+    status = "queued"
+    if queued:
+        logger.info(f"📥 Queue scoring | session={req.session_id}")
+    elif await Job(job_id, app.state.arq_pool).status() == JobStatus.in_progress:
+        status = "in_progress"
 
     return ScoreResponse(
         session_id=req.session_id,
-        scores=evaluation.dict(),
+        status=status,
+        job_id=job_id,
+        transcript_hash=t_hash,
     )
 
 
+@app.get("/interview/score/{job_id}", response_model=ScoreResponse)
+async def score_status(job_id: str):
+    try:
+        _, session_id, t_hash = job_id.split(":")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid scoring job id")
+
+    # Persisted results outlive ARQ's result retention
+    cached = await SCORE_STORE.get(session_id, t_hash)
+    if cached:
+        return ScoreResponse(
+            session_id=session_id,
+            job_id=job_id,
+            transcript_hash=t_hash,
+            scores=cached["scores"],
+        )
+
+    job = Job(job_id, app.state.arq_pool)
+    status = await job.status()
+    if status == JobStatus.not_found:
+        raise HTTPException(status_code=404, detail="Scoring job not found")
+    if status != JobStatus.complete:
+        return ScoreResponse(
+            session_id=session_id,
+            status="in_progress" if status == JobStatus.in_progress else "queued",
+            job_id=job_id,
+            transcript_hash=t_hash,
+        )
+
+    info = await job.result_info()
+    if info is None or not info.success:
+        return ScoreResponse(session_id=session_id, status="failed", job_id=job_id, transcript_hash=t_hash)
+
+    # The job scored a newer transcript than the one it was queued for
+    return ScoreResponse(
+        session_id=session_id,
+        job_id=job_id,
+        transcript_hash=info.result["transcript_hash"],
+        scores=info.result["scores"],
+    )
+
+
+@app.post("/interview/score/bulk")
+async def score_bulk(req: BulkScoreRequest):
+    """
+    Scores many finished interviews in one request, for HR batch review.
+    Sessions and stored scores are loaded with one query each; the rest are
+    scored concurrently (LLM_SCORING_BULK_CONCURRENCY), paced by the
+    providers' rate limits. Streams one NDJSON line per session as it finishes.
+    """
+    session_ids = list(dict.fromkeys(req.session_ids))
+    if len(session_ids) > settings.LLM_SCORING_BULK_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.LLM_SCORING_BULK_MAX} sessions per request",
+        )
+
+    sessions = await SESSION_STORE.get_sessions(session_ids)
+    hashes = {sid: transcript_hash(doc.get("transcript", [])) for sid, doc in sessions.items()}
+    cached = await SCORE_STORE.get_many(hashes)
+    pending = [sid for sid in session_ids if sid in sessions and sid not in cached]
+    logger.info(f"📦 Bulk scoring | {len(session_ids)} sessions, {len(cached)} cached, {len(pending)} to score")
+
+    limit = asyncio.Semaphore(settings.LLM_SCORING_BULK_CONCURRENCY)
+
+    async def score_one(session_id: str) -> ScoreResponse:
+        sess = sessions[session_id]
+        # Any failure (model or Mongo) becomes this session's line, not the end of the stream
+        try:
+            async with limit:
+                evaluation = await gateway.evaluate_interview(
+                    transcript=sess.get("transcript", []),
+                    job_title=sess["job_title"],
+                    fallback=False,
+                )
+            scores = evaluation.dict()
+            await SCORE_STORE.save(session_id, hashes[session_id], scores)
+        except Exception as e:
+            logger.warning(f"Bulk scoring failed for {session_id}: {e}")
+            return ScoreResponse(session_id=session_id, status="failed", transcript_hash=hashes[session_id])
+        return ScoreResponse(session_id=session_id, transcript_hash=hashes[session_id], scores=scores)
+
+    async def results():
+        for sid in session_ids:
+            if sid not in sessions:
+                yield json.dumps({"session_id": sid, "status": "not_found"}) + "\n"
+            elif sid in cached:
+                yield ScoreResponse(
+                    session_id=sid, transcript_hash=hashes[sid], scores=cached[sid]["scores"]
+                ).json() + "\n"
+
+        tasks = [asyncio.create_task(score_one(sid)) for sid in pending]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield (await next_done).json() + "\n"
+        finally:
+            # Client went away: stop scoring what nobody will read
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
 # -------------------------------------------------------------------
 # 4. REAL-TIME VOICE (HUME PROXY)
 # -------------------------------------------------------------------
@@ -219,3 +453,13 @@ async def health():
         "gateway": "active",
         "version": "3.2.0",
     }
+
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "rag": rag.stats(),
+        "llm": gateway.stats(),
+        "voice": ws_manager.stats(),
+        "memory": memory.stats(),
+    }
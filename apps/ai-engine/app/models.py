@@ -1,4 +1,6 @@
 import os
+import hashlib
+import json
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
@@ -44,7 +46,13 @@ class ScoreRequest(BaseModel):
 
 class ScoreResponse(BaseModel):
     session_id: str
-    scores: Dict[str, Any]
+    status: str = "complete"  # queued | in_progress | complete | failed
+    job_id: Optional[str] = None
+    transcript_hash: Optional[str] = None
+    scores: Optional[Dict[str, Any]] = None
+
+class BulkScoreRequest(BaseModel):
+    session_ids: List[str]
 
 class SecurityEvent(BaseModel):
     session_id: str
@@ -55,6 +63,23 @@ class EmotionSignal(BaseModel):
     session_id: str
     signals: Dict[str, float]
 
+class CandidateProfile(BaseModel):
+    """Structured resume summary produced by the worker (see parse_and_ingest_resume)."""
+    skills: List[str] = []
+    seniority: Optional[str] = None
+    recent_role: Optional[str] = None
+    highlights: List[str] = []
+
+    def to_context(self) -> str:
+        """Compact interview context, in the same chunk format as RAG results."""
+        parts = []
+        if self.recent_role or self.seniority:
+            parts.append(f"Most recent role: {self.recent_role or 'unknown'} ({self.seniority or 'seniority unknown'})")
+        if self.skills:
+            parts.append(f"Skills: {', '.join(self.skills)}")
+        parts.extend(f"Highlight: {h}" for h in self.highlights)
+        return "\n---\n".join(parts)
+
 # --- MONGODB STORE ---
 
 class MongoSessionStore:
@@ -96,6 +121,8 @@ class MongoSessionStore:
                 "rag_context": rag_context,
                 "mode": mode,
                 "transcript": [],
+                "summary": "",
+                "summary_upto": 0,
                 "security_events": [],
                 "emotion_context": {},
                 "started_at": datetime.utcnow()
@@ -110,12 +137,27 @@ class MongoSessionStore:
             raise KeyError(f"Session {session_id} not found in ai_sessions")
         return doc
 
+    async def get_sessions(self, session_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Several sessions in one query, keyed by session id (missing ids are absent)."""
+        cursor = db.ai_sessions.find(
+            {"assessment_id": {"$in": session_ids}},
+            {"assessment_id": 1, "job_title": 1, "transcript": 1},
+        )
+        return {doc["assessment_id"]: doc async for doc in cursor}
+
     async def add_transcript(self, session_id: str, role: str, text: str):
         await db.ai_sessions.update_one(
             {"assessment_id": session_id},
             {"$push": {"transcript": {"role": role, "text": text, "timestamp": datetime.utcnow()}}}
         )
 
+    async def update_summary(self, session_id: str, summary: str, upto: int):
+        """Running summary of transcript[:upto] (see services/memory.py)."""
+        await db.ai_sessions.update_one(
+            {"assessment_id": session_id},
+            {"$set": {"summary": summary, "summary_upto": upto}}
+        )
+
     async def update_emotion(self, session_id: str, signals: dict):
         await db.ai_sessions.update_one(
             {"assessment_id": session_id},
@@ -128,4 +170,68 @@ class MongoSessionStore:
             {"$push": {"security_events": event.dict()}}
         )
 
-SESSION_STORE = MongoSessionStore()
\ No newline at end of file
+SESSION_STORE = MongoSessionStore()
+
+class MongoProfileStore:
+    """
+    Precomputed candidate profiles in the 'candidate_profiles' collection.
+    One document per candidate (_id = candidate_id), tagged with the hash of
+    the resume it was derived from.
+    """
+
+    async def get(self, candidate_id: str) -> Optional[Dict[str, Any]]:
+        return await db.candidate_profiles.find_one({"_id": candidate_id})
+
+    async def save(self, candidate_id: str, doc_hash: str, profile: CandidateProfile):
+        await db.candidate_profiles.update_one(
+            {"_id": candidate_id},
+            {"$set": {
+                "doc_hash": doc_hash,
+                "profile": profile.dict(),
+                "updated_at": datetime.utcnow(),
+            }},
+            upsert=True
+        )
+
+    async def invalidate(self, candidate_id: str, keep_hash: Optional[str] = None):
+        """Drops the profile unless it was built from keep_hash."""
+        query: Dict[str, Any] = {"_id": candidate_id}
+        if keep_hash:
+            query["doc_hash"] = {"$ne": keep_hash}
+        await db.candidate_profiles.delete_one(query)
+
+PROFILE_STORE = MongoProfileStore()
+
+def transcript_hash(transcript: List[Dict[str, Any]]) -> str:
+    """Hash of the scoreable content of a transcript (role + text, no timestamps)."""
+    payload = json.dumps([[m.get("role", ""), m.get("text", "")] for m in transcript], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class MongoScoreStore:
+    """
+    Interview scores in the 'interview_scores' collection, one document per
+    (session, transcript hash). An unchanged transcript is never re-scored.
+    """
+
+    async def get(self, session_id: str, t_hash: str) -> Optional[Dict[str, Any]]:
+        return await db.interview_scores.find_one({"_id": f"{session_id}:{t_hash}"})
+
+    async def get_many(self, hashes: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+        """Stored scores for {session_id: transcript hash}, in one query, keyed by session id."""
+        ids = [f"{session_id}:{t_hash}" for session_id, t_hash in hashes.items()]
+        cursor = db.interview_scores.find({"_id": {"$in": ids}})
+        return {doc["session_id"]: doc async for doc in cursor}
+
+    async def save(self, session_id: str, t_hash: str, scores: Dict[str, Any]):
+        await db.interview_scores.update_one(
+            {"_id": f"{session_id}:{t_hash}"},
+            {"$set": {
+                "session_id": session_id,
+                "transcript_hash": t_hash,
+                "scores": scores,
+                "scored_at": datetime.utcnow(),
+            }},
+            upsert=True
+        )
+
+SCORE_STORE = MongoScoreStore()
@@ -1,48 +1,157 @@
-import os, argparse
-from typing import List
-import chromadb
-from chromadb.config import Settings
+import os, argparse, asyncio, hashlib, json, logging, threading
+from typing import Any, Coroutine, Dict, Iterator, Optional, Tuple
 
-DB_DIR = os.path.join(os.path.dirname(__file__), "..", "chroma_db")
+from app.core.config import get_settings
+from app.services.rag_service import rag, split_paragraphs
 
-def get_client():
-    os.makedirs(DB_DIR, exist_ok=True)
-    client = chromadb.PersistentClient(path=DB_DIR, settings=Settings(anonymized_telemetry=False))
-    return client
+settings = get_settings()
+logger = logging.getLogger("fortitwin.rag.kb")
 
-def collection():
-    client = get_client()
-    return client.get_or_create_collection("fortitwin_docs")
+# Knowledge-base docs live in the same vector store as resumes, under one scope
+KB_SCOPE = "knowledge_base"
 
-def ingest_dir(path: str):
-    col = collection()
-    docs, ids = [], []
+# Loop for the sync entry points. The rag singleton's clients, semaphore and
+# batcher stay bound to the loop they first ran on, so every sync call must
+# run on the same long-lived loop rather than a fresh asyncio.run().
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def run_sync(coro: Coroutine) -> Any:
+    """Runs a coroutine on the module's background loop and waits for it."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="rag-kb-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+
+def load_manifest(path: str) -> Dict[str, Dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def save_manifest(path: str, manifest: Dict[str, Dict]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def file_sha256(fp: str) -> str:
+    sha = hashlib.sha256()
+    with open(fp, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def walk_files(path: str) -> Iterator[Tuple[str, str]]:
+    """Yields (absolute path, path relative to the ingest root) lazily."""
     for root, _, files in os.walk(path):
-        for f in files:
+        for f in sorted(files):
             fp = os.path.join(root, f)
+            yield fp, os.path.relpath(fp, path)
+
+
+async def ingest_dir(path: str, concurrency: int = 4) -> Dict[str, int]:
+    """
+    Incrementally ingests a directory of text docs.
+    A manifest of (mtime, size, sha256) per file means re-runs only read and
+    embed files that changed; files under this root that disappeared are
+    removed from the store. Entries (and store doc keys) are absolute paths,
+    so several roots can share one manifest. Files are processed a few at a
+    time, so memory stays bounded regardless of directory size.
+    """
+    root = os.path.abspath(path)
+    manifest_path = settings.KB_MANIFEST_PATH
+    manifest = load_manifest(manifest_path)
+    seen = set()
+    counts = {"ingested": 0, "unchanged": 0, "removed": 0, "failed": 0}
+    sem = asyncio.Semaphore(concurrency)
+
+    async def ingest_file(fp: str, rel: str):
+        async with sem:
             try:
+                st = os.stat(fp)
+                entry = manifest.get(fp)
+                if entry and entry["mtime"] == st.st_mtime and entry["size"] == st.st_size:
+                    counts["unchanged"] += 1
+                    return
+
+                digest = await asyncio.to_thread(file_sha256, fp)
+                if entry and entry["sha256"] == digest:
+                    # Touched but identical: just refresh the stat fingerprint
+                    manifest[fp] = {"mtime": st.st_mtime, "size": st.st_size, "sha256": digest}
+                    counts["unchanged"] += 1
+                    return
+
                 with open(fp, "r", encoding="utf-8", errors="ignore") as fh:
-                    txt = fh.read()
-                docs.append(txt)
-                ids.append(fp)
-            except Exception:
-                continue
-    if docs:
-        col.upsert(documents=docs, ids=ids)
+                    txt = await asyncio.to_thread(fh.read)
+                result = await rag.ingest_document(
+                    text=txt,
+                    metadata={"candidate_id": KB_SCOPE, "filename": rel},
+                    doc_hash=digest,
+                    doc_key=fp,
+                    chunker=split_paragraphs,
+                )
+                if "error" in result:
+                    counts["failed"] += 1
+                    return
+                manifest[fp] = {"mtime": st.st_mtime, "size": st.st_size, "sha256": digest}
+                counts["ingested"] += 1
+            except Exception as e:
+                logger.warning(f"Skipping {rel}: {e}")
+                counts["failed"] += 1
+
+    # Manifests written before keys were absolute: drop those docs once,
+    # the walk below re-ingests whatever still exists under this root.
+    for key in [k for k in manifest if not os.path.isabs(k)]:
+        await rag.delete_document(KB_SCOPE, doc_key=key)
+        del manifest[key]
+
+    # Bounded in-flight set instead of one task per file
+    pending = set()
+    for fp, rel in walk_files(root):
+        seen.add(fp)
+        pending.add(asyncio.create_task(ingest_file(fp, rel)))
+        if len(pending) >= concurrency * 2:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    if pending:
+        await asyncio.wait(pending)
+
+    # Only prune this root: other roots' entries are not in `seen`
+    for fp in [k for k in manifest if k.startswith(root + os.sep) and k not in seen]:
+        await rag.delete_document(KB_SCOPE, doc_key=fp)
+        del manifest[fp]
+        counts["removed"] += 1
+
+    save_manifest(manifest_path, manifest)
+    return counts
+
 
 def retrieve(query: str, k: int = 3) -> str:
     if not query:
         return ""
-    col = collection()
-    res = col.query(query_texts=[query], n_results=k)
-    chunks: List[str] = []
-    for doc in res.get("documents", [[]])[0]:
-        chunks.append(doc[:1200])
-    return "\n\n---\n\n".join(chunks)
+
+    return run_sync(rag.search(query, limit=k, candidate_id=KB_SCOPE))
+
+
+async def _main(path: str):
+    try:
+        return await ingest_dir(path)
+    finally:
+        await rag.close()
+
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     parser = argparse.ArgumentParser()
     parser.add_argument("--ingest", type=str, required=True, help="Directory of text docs to ingest")
     args = parser.parse_args()
-    ingest_dir(args.ingest)
-    print("Ingested docs from", args.ingest)
+    counts = asyncio.run(_main(args.ingest))
+    print("Ingested docs from", args.ingest, counts)
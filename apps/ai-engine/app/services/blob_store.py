@@ -0,0 +1,180 @@
+import fcntl
+import hashlib
+import logging
+import os
+import uuid
+from contextlib import contextmanager
+
+import aiofiles
+from fastapi import UploadFile
+from pydantic import BaseModel
+from starlette.responses import PlainTextResponse
+
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger("fortitwin.blobs")
+
+
+class BlobTooLarge(Exception):
+    """Raised while streaming an upload that exceeds the configured limit."""
+
+
+class UploadSizeLimit:
+    """
+    ASGI middleware that caps request bodies on upload paths.
+    Starlette receives and spools a whole multipart body before the endpoint
+    runs, so the endpoint's own check comes too late to bound what the
+    server accepts. This rejects on Content-Length up front, and for bodies
+    without one stops reading as soon as `max_bytes` have arrived (413).
+    """
+
+    def __init__(self, app, paths, max_bytes: int):
+        self.app = app
+        self.paths = tuple(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            return await self.app(scope, receive, send)
+
+        too_large = PlainTextResponse(f"Upload exceeds {self.max_bytes} bytes", status_code=413)
+        headers = dict(scope["headers"])
+        length = headers.get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            return await too_large(scope, receive, send)
+
+        received = 0
+        exceeded = False
+        responded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise BlobTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+            return message
+
+        async def guarded_send(message):
+            nonlocal responded
+            if exceeded:
+                # The app turned the aborted body into its own error: answer 413 instead
+                if message["type"] == "http.response.start" and not responded:
+                    responded = True
+                    await too_large(scope, receive, send)
+                return
+            responded = responded or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except BlobTooLarge:
+            if not responded:
+                await too_large(scope, receive, send)
+
+
+class StoredBlob(BaseModel):
+    digest: str  # sha256 of the content, doubles as the document hash
+    path: str  # Staging file until attach() moves it into the store
+    size: int
+
+
+class BlobStore:
+    """
+    Content-addressed file store on a directory shared by the API and workers.
+    Uploads are streamed to disk in chunks and hashed on the way, so the API
+    never holds a whole file and jobs only carry the digest.
+
+    Identical uploads share one content file, so jobs never delete it
+    directly: each job holds a hard link to it (attach) and drops only its
+    own link when done (release). The content file goes with the last link.
+    Both run under a flock on the store, so an upload can't attach to a
+    file that a finishing job is removing.
+    """
+
+    def __init__(self, root: str, max_bytes: int, chunk_size: int = 1024 * 1024):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+        os.makedirs(os.path.join(self.root, "jobs"), exist_ok=True)
+        self._lock_path = os.path.join(self.root, ".lock")
+
+    def path_for(self, digest: str) -> str:
+        # Two-level fan-out keeps directories small
+        return os.path.join(self.root, digest[:2], digest)
+
+    def job_path(self, job_id: str) -> str:
+        # Job ids embed client input (candidate_id): hash them into a safe name
+        return os.path.join(self.root, "jobs", hashlib.sha256(job_id.encode("utf-8")).hexdigest())
+
+    @contextmanager
+    def _locked(self):
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def attach(self, blob: StoredBlob, job_id: str) -> str:
+        """
+        Moves a staged upload into the store and links it for job_id.
+        Re-attaching the same job id (a duplicate submission) replaces its
+        link, so it still counts once. Returns the path the job reads.
+        """
+        final_path = self.path_for(blob.digest)
+        link_path = self.job_path(job_id)
+        tmp_link = f"{link_path}.{uuid.uuid4().hex}"
+        with self._locked():
+            if os.path.exists(final_path):
+                # Same content already stored
+                os.remove(blob.path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(blob.path, final_path)
+            if not (os.path.exists(link_path) and os.path.samefile(link_path, final_path)):
+                # rename() over a link to the same inode is a no-op, hence the check
+                os.link(final_path, tmp_link)
+                os.replace(tmp_link, link_path)
+        return link_path
+
+    def release(self, digest: str, job_id: str):
+        """Drops job_id's link, and the content once no other job links it (missing is fine)."""
+        final_path = self.path_for(digest)
+        with self._locked():
+            try:
+                os.remove(self.job_path(job_id))
+            except FileNotFoundError:
+                pass
+            try:
+                if os.stat(final_path).st_nlink <= 1:
+                    os.remove(final_path)
+            except FileNotFoundError:
+                pass
+
+    async def save_upload(self, upload: UploadFile) -> StoredBlob:
+        """Streams an upload to a staging file; attach() it to a job to keep it."""
+        tmp_path = os.path.join(self.root, "tmp", uuid.uuid4().hex)
+        sha = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(tmp_path, "wb") as out:
+                while chunk := await upload.read(self.chunk_size):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise BlobTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+                    sha.update(chunk)
+                    await out.write(chunk)
+            return StoredBlob(digest=sha.hexdigest(), path=tmp_path, size=size)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+# Singleton
+blob_store = BlobStore(settings.BLOB_DIR, settings.MAX_UPLOAD_BYTES)
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import get_settings
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to a character-based estimate
+    tiktoken = None
+
+settings = get_settings()
+logger = logging.getLogger("fortitwin.context")
+
+CHUNK_SEPARATOR = "\n---\n"
+
+
+# -------------------------------------------------------------------
+# 1. TOKEN COUNTING
+# -------------------------------------------------------------------
+@lru_cache()
+def _encoding():
+    if tiktoken is None:
+        logger.warning("⚠️ tiktoken not installed, token budgets use a chars/4 estimate")
+        return None
+    # A persistent cache dir: the BPE file is downloaded once, not per container start
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", os.path.abspath(settings.TIKTOKEN_CACHE_DIR))
+    try:
+        # cl100k is close enough to the Llama/GPT tokenizers for budgeting
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"⚠️ tiktoken unavailable, token budgets use a chars/4 estimate: {e}")
+        return None
+
+
+async def load_tokenizer():
+    """
+    Loads the encoding at startup, off the event loop. The first load may
+    download the BPE file; doing it lazily would stall a request instead.
+    """
+    if await asyncio.to_thread(_encoding) is not None:
+        logger.info("✅ Tokenizer loaded (cl100k_base)")
+
+
+def count_tokens(text: str) -> int:
+    enc = _encoding()
+    if enc is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: Sequence[dict]) -> int:
+    """Prompt size of a chat message list (content + ~4 tokens framing per message)."""
+    return sum(count_tokens(m.get("content") or "") + 4 for m in messages)
+
+
+# -------------------------------------------------------------------
+# 2. MAXIMAL MARGINAL RELEVANCE
+# -------------------------------------------------------------------
+def _normalize(m: np.ndarray) -> np.ndarray:
+    return m / np.maximum(np.linalg.norm(m, axis=-1, keepdims=True), 1e-12)
+
+
+def mmr(query_vecs: Any, doc_vecs: Any, k: int, lambda_: float = 0.7) -> List[int]:
+    """
+    Greedy MMR over doc_vecs. Relevance is the best cosine against any query
+    vector; redundancy is the highest cosine to an already selected doc.
+    The doc-doc similarity matrix is computed once, and each step updates
+    the redundancy vector in O(n), so selection is fully vectorized.
+    Returns indices into doc_vecs in selection order.
+    """
+    docs = _normalize(np.asarray(doc_vecs, dtype=np.float32))
+    queries = _normalize(np.atleast_2d(np.asarray(query_vecs, dtype=np.float32)))
+    n = docs.shape[0]
+    if n == 0:
+        return []
+
+    relevance = (docs @ queries.T).max(axis=1)
+    pairwise = docs @ docs.T
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+
+    for _ in range(min(k, n)):
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        scores = lambda_ * relevance - (1.0 - lambda_) * penalty
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, pairwise[best])
+    return selected
+
+
+# -------------------------------------------------------------------
+# 3. TOKEN-BUDGETED PACKING
+# -------------------------------------------------------------------
+def pack(chunks: Sequence[str], budget_tokens: int, separator: str = CHUNK_SEPARATOR) -> str:
+    """
+    Keeps whole chunks, in order, while they fit the budget. A chunk that
+    doesn't fit is skipped (a later, shorter one may still fit) rather than
+    cut mid-sentence.
+    """
+    kept: List[str] = []
+    used = 0
+    sep_cost = count_tokens(separator)
+    for chunk in chunks:
+        cost = count_tokens(chunk) + (sep_cost if kept else 0)
+        if used + cost > budget_tokens:
+            continue
+        kept.append(chunk)
+        used += cost
+    return separator.join(kept)
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    enc = _encoding()
+    if enc is None:
+        return text[:max_tokens * 4]
+    return enc.decode(enc.encode(text, disallowed_special=())[:max_tokens])
+
+
+def trim_context(context: str, budget_tokens: int) -> str:
+    """
+    Fits an already assembled context string to a budget on chunk boundaries.
+    Falls back to a hard token cut only when not even one chunk fits.
+    """
+    if not context or count_tokens(context) <= budget_tokens:
+        return context
+    chunks = context.split(CHUNK_SEPARATOR)
+    return pack(chunks, budget_tokens) or truncate_tokens(chunks[0], budget_tokens)
+
+
+def segment_lines(lines: Sequence[str], budget_tokens: int) -> List[List[str]]:
+    """
+    Greedy, order-preserving split of lines into segments of at most
+    budget_tokens (one token per line break). A single line over budget
+    is cut to fit rather than dropped.
+    """
+    segments: List[List[str]] = []
+    current: List[str] = []
+    used = 0
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if cost > budget_tokens:
+            line, cost = truncate_tokens(line, budget_tokens - 1), budget_tokens
+        if current and used + cost > budget_tokens:
+            segments.append(current)
+            current, used = [], 0
+        current.append(line)
+        used += cost
+    if current:
+        segments.append(current)
+    return segments
+
+
+class ContextAssembler:
+    """
+    Turns over-fetched search hits into a compact prompt context:
+    MMR re-ranking to drop near-duplicates, then packing into a token budget.
+    """
+
+    def __init__(self, budget_tokens: int, mmr_lambda: float = 0.7):
+        self.budget_tokens = budget_tokens
+        self.mmr_lambda = mmr_lambda
+
+    def assemble(self, query_vecs: Any, hits: Sequence[Any], k: Optional[int] = None) -> str:
+        with_vectors = [h for h in hits if h.vector is not None]
+        if not with_vectors:
+            return pack([h.payload["text"] for h in hits], self.budget_tokens)
+        order = mmr(query_vecs, [h.vector for h in with_vectors], k or len(with_vectors), self.mmr_lambda)
+        return pack([with_vectors[i].payload["text"] for i in order], self.budget_tokens)
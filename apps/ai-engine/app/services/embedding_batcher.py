@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("fortitwin.embedding_batcher")
+
+EmbedFn = Callable[[List[str]], List[Any]]
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces embedding requests from concurrent callers into larger batches.
+
+    Each caller awaits a future; a collector task drains the queue until the
+    batch reaches max_batch texts or max_wait_ms has passed since the first
+    request, runs one model call on the executor and fans the vectors back
+    out. At most `slots` batches run at once (one per executor thread), so
+    while the model is busy new requests pile up into the next, larger batch.
+
+    The queue, slots and collector belong to the loop that created them; a
+    call from another loop (e.g. a later asyncio.run()) rebuilds them, since
+    a collector on a closed loop is never done and never runs again.
+    """
+
+    def __init__(
+        self,
+        embed_fn: EmbedFn,
+        executor: Executor,
+        slots: int,
+        max_batch: int = 256,
+        max_wait_ms: float = 5.0,
+    ):
+        self._embed_fn = embed_fn
+        self._executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.slots = slots
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._queue: "Optional[asyncio.Queue[Tuple[List[str], asyncio.Future]]]" = None
+        self._collector: Optional[asyncio.Task] = None
+        self._running: set = set()
+
+        self.batches = 0
+        self.texts = 0
+        self.requests = 0
+
+    async def embed(self, texts: List[str]) -> List[Any]:
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Whatever the old loop had queued can't be served from here
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.slots)
+            self._queue = asyncio.Queue()
+            self._collector = None
+            self._running = set()
+        if self._collector is None or self._collector.done():
+            self._collector = asyncio.create_task(self._collect())
+        fut = loop.create_future()
+        await self._queue.put((texts, fut))
+        return await fut
+
+    @staticmethod
+    def _fail(batch: List[Tuple[List[str], asyncio.Future]], error: BaseException):
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_exception(error)
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self._queue.get()
+            batch = [first]
+            try:
+                await self._slots.acquire()
+            except asyncio.CancelledError:
+                self._fail(batch, RuntimeError("Embedding batcher closed"))
+                raise
+
+            size = len(first[0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                # Take whatever is already queued without waiting
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                else:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    except asyncio.CancelledError:
+                        self._slots.release()
+                        self._fail(batch, RuntimeError("Embedding batcher closed"))
+                        raise
+                batch.append(item)
+                size += len(item[0])
+
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[List[str], asyncio.Future]]):
+        try:
+            flat = [text for texts, _ in batch for text in texts]
+            loop = asyncio.get_running_loop()
+            try:
+                vectors = await loop.run_in_executor(self._executor, self._embed_fn, flat)
+            except Exception as e:
+                self._fail(batch, e)
+                return
+
+            self.batches += 1
+            self.texts += len(flat)
+            self.requests += len(batch)
+
+            offset = 0
+            for texts, fut in batch:
+                if not fut.done():
+                    fut.set_result(vectors[offset:offset + len(texts)])
+                offset += len(texts)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "texts": self.texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    async def close(self):
+        """Stops collecting, fails requests still queued, and waits for running batches."""
+        if self._loop is not asyncio.get_running_loop():
+            # Never used, or bound to another (closed) loop: nothing left to serve
+            return
+        if self._collector is not None:
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+            self._collector = None
+        while not self._queue.empty():
+            self._fail([self._queue.get_nowait()], RuntimeError("Embedding batcher closed"))
+        for task in list(self._running):
+            await task
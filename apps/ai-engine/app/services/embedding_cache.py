@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+import redis.asyncio as aioredis
+
+logger = logging.getLogger("fortitwin.embedding_cache")
+
+
+def normalize_query(text: str) -> str:
+    """Collapses case and whitespace so trivially different queries share a slot."""
+    return " ".join(text.lower().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Two-tier cache for query embeddings.
+    L1: in-process LRU (bounded by entry count).
+    L2: optional Redis hash shared by every API worker.
+    Keys combine the model name and the normalized query, so switching
+    models never serves stale vectors.
+    """
+
+    def __init__(self, model_name: str, max_size: int = 1024, redis_url: Optional[str] = None, ttl: int = 86400):
+        self.model_name = model_name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._redis = aioredis.from_url(redis_url) if redis_url else None
+
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _key(self, query: str) -> str:
+        digest = hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+        return f"qemb:{self.model_name}:{digest}"
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    async def get(self, query: str) -> Optional[np.ndarray]:
+        key = self._key(query)
+
+        # 1. Local LRU
+        vector = self._lru.get(key)
+        if vector is not None:
+            self._lru.move_to_end(key)
+            self.hits += 1
+            return vector
+
+        # 2. Shared Redis tier
+        if self._redis is not None:
+            try:
+                raw = await self._redis.get(key)
+            except Exception as e:
+                logger.warning(f"Redis query cache unavailable: {e}")
+                raw = None
+            if raw:
+                vector = np.frombuffer(raw, dtype=np.float32)
+                self._remember(key, vector)
+                self.redis_hits += 1
+                return vector
+
+        self.misses += 1
+        return None
+
+    async def put(self, query: str, vector: np.ndarray):
+        key = self._key(query)
+        vector = np.asarray(vector, dtype=np.float32)
+        self._remember(key, vector)
+        if self._redis is not None:
+            try:
+                await self._redis.set(key, vector.tobytes(), ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"Redis query cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.redis_hits + self.misses
+        return {
+            "size": len(self._lru),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.close()
+
+
+class ChunkEmbeddingCache:
+    """
+    Persistent content-hash -> vector store for document chunks.
+    Backed by SQLite (WAL) so the API and every worker process on a node can
+    share it. Calls are blocking; RAGService runs them via asyncio.to_thread.
+    Holds at most max_rows vectors: lookups refresh a row's last_used time,
+    and once a store pushes the table past the cap the least recently used
+    rows are deleted down to prune_to of it.
+    """
+
+    def __init__(self, path: str, model_name: str, max_rows: int = 100_000, prune_to: float = 0.9):
+        self.model_name = model_name
+        self.max_rows = max_rows
+        self.prune_to = prune_to
+        self.pruned = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings "
+            "(digest TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunk_embeddings)")}
+        if "last_used" not in columns:
+            # Caches created before the size cap: existing rows count as oldest
+            self._conn.execute("ALTER TABLE chunk_embeddings ADD COLUMN last_used INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunk_embeddings_last_used ON chunk_embeddings (last_used)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def digest(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text.strip()}".encode("utf-8")).hexdigest()
+
+    def lookup(self, digests: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(digests))
+        with self._lock:
+            # SQLite caps bound parameters, so query in slices
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT digest, vector FROM chunk_embeddings WHERE digest IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for digest, blob in rows:
+                    found[digest] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                hits = list(found)
+                now = int(time.time())
+                for i in range(0, len(hits), 500):
+                    batch = hits[i:i + 500]
+                    self._conn.execute(
+                        f"UPDATE chunk_embeddings SET last_used = ? WHERE digest IN ({','.join('?' * len(batch))})",
+                        [now, *batch],
+                    )
+                self._conn.commit()
+        return found
+
+    def store(self, vectors: Dict[str, np.ndarray]):
+        if not vectors:
+            return
+        now = int(time.time())
+        rows = [(d, np.asarray(v, dtype=np.float32).tobytes(), now) for d, v in vectors.items()]
+        with self._lock:
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO chunk_embeddings (digest, vector, last_used) VALUES (?, ?, ?)", rows
+            ).rowcount
+            if inserted > 0:
+                self._prune()
+            self._conn.commit()
+
+    def _prune(self):
+        """Deletes least recently used rows once the table is over max_rows (caller holds the lock)."""
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()
+        if count <= self.max_rows:
+            return
+        excess = count - int(self.max_rows * self.prune_to)
+        self._conn.execute(
+            "DELETE FROM chunk_embeddings WHERE digest IN "
+            "(SELECT digest FROM chunk_embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self.pruned += excess
+        logger.info(f"🧹 Chunk cache over {self.max_rows} rows, dropped {excess} least recently used")
+
+    def stats(self) -> Dict[str, Any]:
+        # No row count here: COUNT(*) scans the table, too slow for a stats endpoint
+        return {"max_rows": self.max_rows, "pruned": self.pruned}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import httpx
+import numpy as np
+from fastembed import TextEmbedding
+
+from app.core.config import get_settings
+from app.services.embedding_batcher import EmbeddingBatcher
+
+settings = get_settings()
+logger = logging.getLogger("fortitwin.embeddings")
+
+
+class LocalEmbedder:
+    """
+    Runs the FastEmbed model inside this process.
+    ONNX inference is CPU-bound, so it runs on a small dedicated thread pool,
+    optionally behind the cross-request micro-batcher.
+    """
+
+    def __init__(self, model_name: str = settings.EMBEDDING_MODEL):
+        self.model_name = model_name
+        # Loaded on first use (or by warmup()), not at import time.
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.RAG_EMBED_THREADS,
+            thread_name_prefix="rag-embed",
+        )
+
+        # Cross-request micro-batching: concurrent ingests/searches share model calls
+        self.batcher = None
+        if settings.RAG_BATCHING:
+            self.batcher = EmbeddingBatcher(
+                embed_fn=self._embed_sync,
+                executor=self._executor,
+                slots=settings.RAG_EMBED_THREADS,
+                max_batch=settings.RAG_BATCH_MAX_SIZE,
+                max_wait_ms=settings.RAG_BATCH_MAX_WAIT_MS,
+            )
+
+    @property
+    def model(self) -> TextEmbedding:
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    logger.info("🧠 Loading FastEmbed model (this may take a moment)...")
+                    self._model = TextEmbedding(model_name=self.model_name)
+                    logger.info("✅ Embedding model loaded.")
+        return self._model
+
+    def _embed_sync(self, texts: List[str]) -> List[Any]:
+        return list(self.model.embed(texts, batch_size=settings.RAG_BATCH_MAX_SIZE))
+
+    async def embed(self, texts: List[str]) -> List[Any]:
+        """Runs the embedding model on the executor so the loop stays free."""
+        if self.batcher is not None:
+            return await self.batcher.embed(texts)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._embed_sync, texts)
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"backend": "local", "model": self.model_name}
+        if self.batcher is not None:
+            stats["batcher"] = self.batcher.stats()
+        return stats
+
+    async def close(self):
+        if self.batcher is not None:
+            await self.batcher.close()
+        self._executor.shutdown(wait=True)
+
+
+class RemoteEmbedder:
+    """
+    Client for the shared embedding server (app/embedding_server.py).
+    Accepts http://host:port or unix:///path/to.sock. Vectors travel as raw
+    float32 bytes, so a batch is one small binary response.
+    """
+
+    def __init__(self, url: str, model_name: str = settings.EMBEDDING_MODEL):
+        self.model_name = model_name
+        if url.startswith("unix://"):
+            transport = httpx.AsyncHTTPTransport(uds=url[len("unix://"):])
+            self._client = httpx.AsyncClient(transport=transport, base_url="http://embedder", timeout=30.0)
+        else:
+            self._client = httpx.AsyncClient(base_url=url, timeout=30.0)
+        self.url = url
+        self.requests = 0
+        self.texts = 0
+
+    async def embed(self, texts: List[str]) -> List[Any]:
+        if not texts:
+            return []
+        resp = await self._client.post("/embed", json={"texts": texts})
+        resp.raise_for_status()
+        dim = int(resp.headers["x-embedding-dim"])
+        self.requests += 1
+        self.texts += len(texts)
+        return list(np.frombuffer(resp.content, dtype=np.float32).reshape(-1, dim))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "remote", "url": self.url, "requests": self.requests, "texts": self.texts}
+
+    async def close(self):
+        await self._client.aclose()
+
+
+def create_embedder():
+    """Remote embedder when EMBEDDING_SERVER_URL is set, otherwise in-process."""
+    if settings.EMBEDDING_SERVER_URL:
+        logger.info(f"🔗 Using embedding server at {settings.EMBEDDING_SERVER_URL}")
+        return RemoteEmbedder(settings.EMBEDDING_SERVER_URL)
+    return LocalEmbedder()
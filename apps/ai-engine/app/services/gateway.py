@@ -1,7 +1,8 @@
+import asyncio
 import logging
 import random
 import time
-from typing import List, Dict, Optional, Literal, Any
+from typing import AsyncIterator, List, Dict, Optional, Literal, Any
 import instructor
 from pydantic import BaseModel, Field
 from groq import AsyncGroq
@@ -9,6 +10,11 @@ from openai import AsyncOpenAI
 import google.generativeai as genai
 
 from app.core.config import get_settings
+from app.services.context import count_message_tokens, count_tokens, segment_lines, trim_context, truncate_tokens
+from app.services.rate_limit import RateLimiter
+from app.services.resilience import CircuitBreaker, LatencyTracker
+from app.services.response_cache import ResponseCache
+from app.services.routing import RoutingPolicy, Tier
 
 logger = logging.getLogger("fortitwin.gateway")
 settings = get_settings()
@@ -37,8 +43,49 @@ class AssessmentScore(BaseModel):
     communication: int = Field(description="Score 0-10 based on clarity.")
     feedback_summary: str = Field(description="A concise summary of strengths and areas for improvement.")
 
+class SegmentAssessment(BaseModel):
+    """Scores and evidence for one part of a long interview (map step of scoring)."""
+    role_fit: int = Field(description="Score 0-10 based on technical skills shown in this part.")
+    culture_fit: int = Field(description="Score 0-10 based on personality shown in this part.")
+    honesty: int = Field(description="Score 0-10 based on consistency in this part.")
+    communication: int = Field(description="Score 0-10 based on clarity in this part.")
+    evidence: List[str] = Field(
+        default=[],
+        description="Up to 4 short, concrete observations (facts or quotes) behind the scores."
+    )
+
+SCORE_FIELDS = ("role_fit", "culture_fit", "honesty", "communication")
+
+class ConversationSummary(BaseModel):
+    """Running summary of the older part of an interview."""
+    summary: str = Field(
+        description="Compact third-person summary: topics covered, claims the candidate made, strengths and gaps. Under 120 words."
+    )
+
+# -------------------------------------------------------------------
+# 2. PROVIDER HEALTH
+# -------------------------------------------------------------------
+class Provider:
+    """A chat backend (one API client) with its circuit breaker. Models are chosen per call by the router."""
+
+    def __init__(self, name: str, client: Any, temperature: float, **options):
+        self.name = name
+        self.client = client
+        self.temperature = temperature
+        self.options = options  # Extra create() kwargs, e.g. max_retries
+        self.latency = LatencyTracker()  # All successful calls, any model
+        self.breaker = CircuitBreaker(
+            name,
+            failure_threshold=settings.LLM_BREAKER_FAILURES,
+            reset_timeout=settings.LLM_BREAKER_RESET,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.latency.stats(), "breaker": self.breaker.stats()}
+
+
 # -------------------------------------------------------------------
-# 2. THE LLM GATEWAY (ROUTER)
+# 3. THE LLM GATEWAY (ROUTER)
 # -------------------------------------------------------------------
 class LLMGateway:
     def __init__(self):
@@ -71,7 +118,163 @@ class LLMGateway:
             # Instructor support for Gemini is different, handled manually if needed
             logger.info("✅ Gemini Client Initialized")
 
-    async def generate_response(
+        # D. Providers by name; the routing policy decides model + order per call type
+        self.providers: Dict[str, Provider] = {}
+        if self.groq_client:
+            self.providers["groq"] = Provider("groq", self.groq_client, 0.6, max_retries=2)
+        if self.openai_client:
+            self.providers["openai"] = Provider("openai", self.openai_client, 0.7)
+        self.routing = RoutingPolicy()
+        # Shared per-model quotas; live turns go before background work
+        self.limits = RateLimiter(
+            quotas={"groq": settings.LLM_RATE_GROQ_RPM, "openai": settings.LLM_RATE_OPENAI_RPM},
+            redis_url=settings.REDIS_URL if settings.LLM_RATE_REDIS else None,
+        )
+        self.prompt_tokens: Dict[str, LatencyTracker] = {}
+        self.hedges = 0
+        self.hedge_wins = 0
+
+        # E. Opt-in response cache (opening questions, hints; never scoring)
+        self.cache = None
+        if settings.LLM_CACHE:
+            embed = None
+            if settings.LLM_CACHE_SEMANTIC:
+                # Reuse the RAG embedder instead of loading a second model copy
+                from app.services.rag_service import rag
+                embed = rag.embedder.embed
+            self.cache = ResponseCache(
+                call_types=[t.strip() for t in settings.LLM_CACHE_CALL_TYPES.split(",") if t.strip()],
+                max_size=settings.LLM_CACHE_SIZE,
+                ttl=settings.LLM_CACHE_TTL,
+                redis_url=settings.REDIS_URL if settings.LLM_CACHE_REDIS else None,
+                embed=embed,
+                similarity=settings.LLM_CACHE_SIMILARITY,
+            )
+
+    def _hedge_delay(self, call_type: str, tier: Tier) -> float:
+        """How long to wait for a model before firing the next tier."""
+        p95 = self.routing.p95(call_type, tier)
+        if p95 is None:
+            return settings.LLM_HEDGE_DEFAULT_DELAY
+        return max(settings.LLM_HEDGE_MIN_DELAY, p95)
+
+    async def _admit(self, call_type: str, tier: Tier):
+        """Waits for the model's quota. A cancelled wait abandons any half-open probe."""
+        try:
+            await self.limits.acquire(tier.provider, tier.model, self.routing.priority(call_type))
+        except asyncio.CancelledError:
+            self.providers[tier.provider].breaker.release()
+            raise
+
+    async def _call(
+        self, call_type: str, tier: Tier, response_model: Any, messages: List[Dict[str, str]], timeout: float
+    ) -> Any:
+        """One model call, timed and reported to the router and the provider's breaker. Cancellation is neutral."""
+        provider = self.providers[tier.provider]
+        self.prompt_tokens.setdefault(call_type, LatencyTracker()).record(count_message_tokens(messages))
+        params = dict(provider.options)
+        if call_type != "scoring":
+            params["temperature"] = provider.temperature
+        # Quota wait happens before the clock starts: it is not provider latency
+        await self._admit(call_type, tier)
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(
+                provider.client.chat.completions.create(
+                    model=tier.model,
+                    response_model=response_model,
+                    messages=messages,
+                    **params
+                ),
+                timeout=timeout,
+            )
+        except asyncio.CancelledError:
+            provider.breaker.release()
+            raise
+        except Exception:
+            provider.breaker.record_failure()
+            self.routing.record(call_type, tier, time.perf_counter() - start, ok=False)
+            raise
+        elapsed = time.perf_counter() - start
+        self.routing.record(call_type, tier, elapsed)
+        provider.latency.record(elapsed)
+        provider.breaker.record_success()
+        return result
+
+    async def _hedged(
+        self,
+        call_type: str,
+        response_model: Any,
+        messages: List[Dict[str, str]],
+        hedge: bool = settings.LLM_HEDGING,
+        timeout: float = settings.LLM_TIMEOUT,
+    ) -> Any:
+        """
+        Calls the routed tier for this call type. If it hasn't answered within
+        its p95-derived deadline, the next tier is fired as well and the first
+        successful answer wins; the loser is cancelled. The hedge always goes
+        to a different provider than the calls in flight: a slow provider is
+        usually slow for all of its models. A tier that fails outright is
+        replaced by the next one immediately (same provider allowed).
+        Tiers whose provider has an open circuit are skipped.
+        """
+        remaining = list(self.routing.plan(call_type, self.providers))
+
+        def next_tier(exclude_providers=()) -> Optional[Tier]:
+            for tier in list(remaining):
+                if tier.provider in exclude_providers:
+                    continue  # Kept for a later failover
+                remaining.remove(tier)
+                # allow() is only asked when we're about to call (it may start a half-open probe)
+                if self.providers[tier.provider].breaker.allow():
+                    return tier
+            return None
+
+        def start(tier: Tier) -> asyncio.Task:
+            return asyncio.create_task(self._call(call_type, tier, response_model, messages, timeout))
+
+        primary = next_tier()
+        if primary is None:
+            raise RuntimeError("No healthy LLM provider")
+
+        tasks: Dict[asyncio.Task, Tier] = {start(primary): primary}
+        deadline = self._hedge_delay(call_type, primary) if hedge else None
+        hedged = False
+        last_error: Exception = RuntimeError("No healthy LLM provider")
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=deadline, return_when=asyncio.FIRST_COMPLETED)
+                deadline = None
+
+                if not done:
+                    # Primary is slower than its p95: hedge on another provider
+                    backup = next_tier(exclude_providers={t.provider for t in tasks.values()})
+                    if backup:
+                        hedged = True
+                        self.hedges += 1
+                        logger.info(f"⏱️ {primary.model} slow, hedging with {backup.model}")
+                        tasks[start(backup)] = backup
+                    continue
+
+                for task in done:
+                    tier = tasks.pop(task)
+                    if task.exception() is None:
+                        if hedged and tier != primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_error = task.exception()
+                    logger.warning(f"{tier.provider}/{tier.model} failed, failing over: {last_error!r}")
+
+                if not tasks:
+                    backup = next_tier()
+                    if backup:
+                        tasks[start(backup)] = backup
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise last_error
+
+    def _build_messages(
         self,
         job_title: str,
         company: str,
@@ -79,12 +282,7 @@ class LLMGateway:
         context: str = "",
         emotion_data: Dict[str, float] = {},
         security_alert: Optional[str] = None
-    ) -> InterviewTurn:
-        """
-        Generates the next interview question.
-        ROUTING STRATEGY: Always try Groq (Llama 3) first for speed.
-        """
-        
+    ) -> List[Dict[str, str]]:
         # 1. Construct System Prompt
         system_prompt = (
             f"You are an interviewer for {company} hiring a {job_title}. "
@@ -107,31 +305,45 @@ class LLMGateway:
         
         # Add RAG context if available
         if context:
-            messages.append({"role": "system", "content": f"BACKGROUND KNOWLEDGE:\n{context[:1000]}"})
+            messages.append({"role": "system", "content": f"BACKGROUND KNOWLEDGE:\n{trim_context(context, settings.LLM_CONTEXT_TOKENS)}"})
             
         messages.extend(history)
+        return messages
+
+    async def generate_response(
+        self,
+        job_title: str,
+        company: str,
+        history: List[Dict[str, str]],
+        context: str = "",
+        emotion_data: Dict[str, float] = {},
+        security_alert: Optional[str] = None,
+        call_type: str = "text_turn"
+    ) -> InterviewTurn:
+        """
+        Generates the next interview question.
+        ROUTING STRATEGY: the routing policy picks the model for call_type
+        (Llama 3.3 70B while it meets the SLO, the 8B model when it doesn't);
+        the next tier is hedged in when the routed one is slow and used
+        outright when its provider's circuit is open.
+        """
+        messages = self._build_messages(job_title, company, history, context, emotion_data, security_alert)
+
+        # 4. Cached answer for a repeatable prompt (e.g. the opening question for a posting)
+        cache = self.cache if self.cache is not None and self.cache.enabled_for(call_type) else None
+        if cache is not None:
+            cached = await cache.get(call_type, messages)
+            if cached is not None:
+                return InterviewTurn(**cached)
 
-        # 4. Call LLM (Try Groq First)
+        # 5. Call LLM (routed + hedged across healthy providers)
         try:
-            if self.groq_client:
-                return await self.groq_client.chat.completions.create(
-                    model="llama-3.3-70b-versatile", # Or llama3-8b-8192 for speed
-                    response_model=InterviewTurn,
-                    messages=messages,
-                    temperature=0.6,
-                    max_retries=2
-                )
+            turn = await self._hedged(call_type, InterviewTurn, messages)
+            if cache is not None:
+                await cache.put(call_type, messages, turn.dict())
+            return turn
         except Exception as e:
-            logger.warning(f"Groq failed, failing over: {e}")
-
-        # 5. Fallback to OpenAI (if Groq fails)
-        if self.openai_client:
-            return await self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo", 
-                response_model=InterviewTurn,
-                messages=messages,
-                temperature=0.7
-            )
+            logger.warning(f"All providers failed: {e}")
 
         # 6. Ultimate Fallback (Offline)
         return InterviewTurn(
@@ -140,45 +352,265 @@ class LLMGateway:
             sentiment_analysis="Fallback"
         )
 
+    async def stream_response(
+        self,
+        job_title: str,
+        company: str,
+        history: List[Dict[str, str]],
+        context: str = "",
+        emotion_data: Dict[str, float] = {},
+        security_alert: Optional[str] = None,
+        call_type: str = "voice_turn"
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of generate_response for voice turns.
+        Yields response_text deltas as the partial InterviewTurn fills in, so
+        speech can start after the first sentence instead of the whole turn.
+        Same routing: routed tier first, then the fallbacks, then the offline
+        line. A tier is only abandoned if it fails before producing any text.
+        Streams aren't hedged (both would be speaking), but outcomes still
+        feed the breakers, and the router sees time to first text.
+        Opening the stream gets LLM_TIMEOUT; after that each chunk must arrive
+        within LLM_STREAM_CHUNK_TIMEOUT and the turn within LLM_STREAM_TIMEOUT.
+        A stall is a provider failure, like a non-streaming timeout.
+        """
+        messages = self._build_messages(job_title, company, history, context, emotion_data, security_alert)
+
+        for tier in self.routing.plan(call_type, self.providers):
+            provider = self.providers[tier.provider]
+            if not provider.breaker.allow():
+                continue
+            self.prompt_tokens.setdefault(call_type, LatencyTracker()).record(count_message_tokens(messages))
+            await self._admit(call_type, tier)
+            emitted = ""
+            partials = None
+            start = time.perf_counter()
+            deadline = start + settings.LLM_STREAM_TIMEOUT
+            try:
+                partials = await asyncio.wait_for(
+                    provider.client.chat.completions.create(
+                        model=tier.model,
+                        response_model=instructor.Partial[InterviewTurn],
+                        messages=messages,
+                        temperature=provider.temperature,
+                        stream=True,
+                    ),
+                    timeout=settings.LLM_TIMEOUT,
+                )
+                chunks = partials.__aiter__()
+                while True:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError(f"stream exceeded {settings.LLM_STREAM_TIMEOUT}s")
+                    try:
+                        partial = await asyncio.wait_for(
+                            chunks.__anext__(), min(settings.LLM_STREAM_CHUNK_TIMEOUT, remaining)
+                        )
+                    except StopAsyncIteration:
+                        break
+                    text = partial.response_text or ""
+                    if len(text) > len(emitted) and text.startswith(emitted):
+                        if not emitted:
+                            self.routing.record(call_type, tier, time.perf_counter() - start)
+                        yield text[len(emitted):]
+                        emitted = text
+                if emitted:
+                    provider.breaker.record_success()
+                    return
+                provider.breaker.record_failure()
+                self.routing.record(call_type, tier, time.perf_counter() - start, ok=False)
+            except (asyncio.CancelledError, GeneratorExit):
+                provider.breaker.release()
+                raise
+            except Exception as e:
+                provider.breaker.record_failure()
+                if not emitted:
+                    self.routing.record(call_type, tier, time.perf_counter() - start, ok=False)
+                if isinstance(e, asyncio.TimeoutError) and hasattr(partials, "aclose"):
+                    # Stalled mid-stream: drop the response so its connection is released
+                    try:
+                        await partials.aclose()
+                    except Exception:
+                        pass
+                reason = str(e) or type(e).__name__
+                if emitted:
+                    # Already spoken in part: end the turn rather than restart it
+                    logger.warning(f"{provider.name} stream broke mid-turn: {reason}")
+                    return
+                logger.warning(f"{provider.name} stream failed, failing over: {reason}")
+
+        # Ultimate Fallback (Offline)
+        yield "Could you elaborate on your experience?"
+
     async def evaluate_interview(
         self, 
         transcript: List[Dict[str, str]], 
-        job_title: str
+        job_title: str,
+        fallback: bool = True,
     ) -> AssessmentScore:
         """
         Scores the interview.
         ROUTING STRATEGY: Use OpenAI (GPT-4) or Gemini Pro for deep analysis.
+        Transcripts longer than LLM_SCORING_SEGMENT_TOKENS are scored
+        map-reduce (see _score_segments), so latency follows segment size
+        rather than interview length.
+        fallback=False raises instead of returning the neutral placeholder
+        score, so callers that persist results never store it.
         """
-        prompt = f"Evaluate this interview for the role of {job_title}."
-        
-        # Convert transcript to string for context
-        conversation_text = "\n".join([f"{m['role']}: {m['content']}" for m in transcript])
-        
-        messages = [
-            {"role": "system", "content": "You are an expert HR evaluator. Be strict and fair."},
-            {"role": "user", "content": f"{prompt}\n\nTRANSCRIPT:\n{conversation_text}"}
-        ]
+        # Convert transcript to lines for context
+        lines = [f"{m['role']}: {m['text']}" for m in transcript]
+        segments = segment_lines(lines, settings.LLM_SCORING_SEGMENT_TOKENS)
 
-        # Prefer OpenAI for scoring
-        if self.openai_client:
-            return await self.openai_client.chat.completions.create(
-                model="gpt-4o", # Smartest model for scoring
-                response_model=AssessmentScore,
-                messages=messages
-            )
-        
-        # Fallback to Groq (Llama 70b is good at reasoning too)
-        if self.groq_client:
-            return await self.groq_client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                response_model=AssessmentScore,
-                messages=messages
+        # Prefer OpenAI (gpt-4o) for scoring, Llama 70b as fallback (see routing.POLICIES)
+        # Not hedged: a duplicate scoring call is expensive and nobody is waiting on audio.
+        try:
+            if len(segments) > 1:
+                return await self._score_segments(job_title, segments)
+
+            messages = [
+                {"role": "system", "content": "You are an expert HR evaluator. Be strict and fair."},
+                {"role": "user", "content": f"Evaluate this interview for the role of {job_title}.\n\nTRANSCRIPT:\n" + "\n".join(lines)}
+            ]
+            return await self._hedged(
+                "scoring", AssessmentScore, messages, hedge=False, timeout=settings.LLM_SCORING_TIMEOUT
             )
+        except Exception as e:
+            logger.warning(f"Scoring failed on all providers: {e}")
+            if not fallback:
+                raise
 
         return AssessmentScore(
             role_fit=5, culture_fit=5, honesty=5, communication=5, 
             feedback_summary="Scoring service unavailable."
         )
 
+    async def _score_segments(self, job_title: str, segments: List[List[str]]) -> AssessmentScore:
+        """
+        Map: score every segment concurrently (at most LLM_SCORING_CONCURRENCY
+        in flight) on the "scoring_segment" route.
+        Reduce: one small "scoring" call over the per-segment scores and
+        evidence. If only the reduce step fails, the token-weighted average of
+        the segment scores is returned, with the evidence as feedback.
+        """
+        limit = asyncio.Semaphore(settings.LLM_SCORING_CONCURRENCY)
+        total = len(segments)
+
+        async def score(index: int, segment: List[str]) -> SegmentAssessment:
+            messages = [
+                {
+                    "role": "system",
+                    "content": "You are an expert HR evaluator. Be strict and fair. "
+                               "Score only what this part of the interview shows.",
+                },
+                {
+                    "role": "user",
+                    "content": f"Evaluate part {index + 1} of {total} of an interview for the role of {job_title}."
+                               f"\n\nTRANSCRIPT (PART {index + 1}/{total}):\n" + "\n".join(segment),
+                },
+            ]
+            async with limit:
+                return await self._hedged(
+                    "scoring_segment", SegmentAssessment, messages, hedge=False, timeout=settings.LLM_SCORING_TIMEOUT
+                )
+
+        results = await asyncio.gather(*(score(i, s) for i, s in enumerate(segments)), return_exceptions=True)
+        parts = [
+            (index, result, count_tokens("\n".join(segments[index])))
+            for index, result in enumerate(results)
+            if not isinstance(result, BaseException)
+        ]
+        if not parts:
+            raise results[0]
+        if len(parts) < total:
+            logger.warning(f"Scoring: {total - len(parts)} of {total} segments failed, reducing over the rest")
+
+        weight = sum(w for _, _, w in parts)
+        averages = {
+            field: round(sum(getattr(r, field) * w for _, r, w in parts) / weight)
+            for field in SCORE_FIELDS
+        }
+
+        findings = "\n\n".join(
+            f"PART {index + 1}/{total}: "
+            + ", ".join(f"{field}={getattr(result, field)}" for field in SCORE_FIELDS)
+            + "".join(f"\n- {item}" for item in result.evidence)
+            for index, result, _ in parts
+        )
+        messages = [
+            {"role": "system", "content": "You are an expert HR evaluator. Be strict and fair."},
+            {
+                "role": "user",
+                "content": f"An interview for the role of {job_title} was assessed in {total} parts. "
+                           "Combine the part assessments below into one final evaluation. "
+                           "Weigh the evidence, not just the averages; inconsistencies between parts count against honesty."
+                           f"\n\n{findings}",
+            },
+        ]
+        try:
+            return await self._hedged(
+                "scoring", AssessmentScore, messages, hedge=False, timeout=settings.LLM_SCORING_TIMEOUT
+            )
+        except Exception as e:
+            logger.warning(f"Scoring reduce step failed, using segment averages: {e}")
+
+        evidence = [item for _, result, _ in parts for item in result.evidence]
+        return AssessmentScore(
+            **averages,
+            feedback_summary=truncate_tokens("; ".join(evidence) or "Scored from segment averages.", 200),
+        )
+
+    async def summarize_conversation(self, previous_summary: str, entries: List[Dict[str, Any]]) -> str:
+        """
+        Folds transcript entries into the running interview summary.
+        Runs in the background (services/memory.py), on the small model.
+        """
+        lines = "\n".join(f"{e['role']}: {e['text']}" for e in entries)
+        messages = [
+            {
+                "role": "system",
+                "content": "You maintain the running summary of a job interview. "
+                           "Merge the new exchanges into the existing summary. Keep it under 120 words.",
+            },
+            {"role": "user", "content": f"EXISTING SUMMARY:\n{previous_summary or '(none)'}\n\nNEW EXCHANGES:\n{lines}"},
+        ]
+        result = await self._hedged("summary", ConversationSummary, messages, hedge=False)
+        return truncate_tokens(result.summary, settings.MEMORY_SUMMARY_TOKENS)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "providers": {name: p.stats() for name, p in self.providers.items()},
+            "routing": self.routing.stats(),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "rate_limits": self.limits.stats(),
+            "prompt_tokens": {
+                call_type: {"calls": t.count, "p50": t.p50(), "p95": t.p95(), "max": t.quantile(1.0)}
+                for call_type, t in self.prompt_tokens.items()
+            },
+        }
+
+    def use_http_client(self, http_client: Any):
+        """
+        Rebuilds the provider SDK clients on a shared httpx client, so a
+        process that owns a connection pool (the ARQ worker) routes gateway
+        calls through it. Breakers and latency history are kept.
+        """
+        if self.groq_client:
+            self.groq_client = instructor.patch(
+                AsyncGroq(api_key=settings.GROQ_API_KEY, http_client=http_client)
+            )
+            self.providers["groq"].client = self.groq_client
+        if self.openai_client:
+            self.openai_client = instructor.patch(
+                AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=http_client)
+            )
+            self.providers["openai"].client = self.openai_client
+
+    async def close(self):
+        if self.cache is not None:
+            await self.cache.close()
+        await self.limits.close()
+
 # Singleton Instance
 gateway = LLMGateway()
\ No newline at end of file
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.models import SESSION_STORE
+from app.services.context import count_message_tokens
+from app.services.gateway import gateway
+
+settings = get_settings()
+logger = logging.getLogger("fortitwin.memory")
+
+# Transcript roles -> chat roles
+CHAT_ROLES = {"candidate": "user", "interviewer": "assistant"}
+
+SummarizeFn = Callable[[str, List[Dict[str, Any]]], Awaitable[str]]
+
+
+class TokenStats:
+    """Prompt-token counts bucketed by turn number, to show they stay flat."""
+
+    BUCKETS = ((1, 5), (6, 10), (11, 20), (21, 40), (41, None))
+
+    def __init__(self):
+        self._sums: Dict[str, List[int]] = {}
+
+    @classmethod
+    def _bucket(cls, turn: int) -> str:
+        for low, high in cls.BUCKETS:
+            if high is None or turn <= high:
+                return f"{low}+" if high is None else f"{low}-{high}"
+        return "?"
+
+    def record(self, turn: int, tokens: int):
+        total, count, peak = self._sums.get(self._bucket(turn), [0, 0, 0])
+        self._sums[self._bucket(turn)] = [total + tokens, count + 1, max(peak, tokens)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            bucket: {"turns": count, "avg_tokens": round(total / count, 1), "max_tokens": peak}
+            for bucket, (total, count, peak) in self._sums.items()
+        }
+
+
+class ConversationMemory:
+    """
+    Bounded chat history for interview turns.
+
+    The prompt gets the running summary (as a system message) plus the last
+    `recent` transcript entries verbatim, so its size stays roughly constant
+    however long the interview runs. Entries that fall out of the verbatim
+    window are folded into the summary by a background task after each turn,
+    never on the request path. The summary and how far it reaches
+    (summary_upto) live in the session document and in a small local cache,
+    so long-lived websocket sessions see updates without re-reading Mongo.
+    """
+
+    def __init__(
+        self,
+        summarize: SummarizeFn,
+        recent: int = settings.MEMORY_RECENT_ENTRIES,
+        cache_size: int = 1024,
+    ):
+        self._summarize = summarize
+        self.recent = recent
+        self.cache_size = cache_size
+        self._summaries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._running: Dict[str, asyncio.Task] = {}
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+
+        self.tokens = TokenStats()
+        self.updates = 0
+        self.update_failures = 0
+
+    def _summary(self, session_id: str, sess: dict) -> Tuple[str, int]:
+        cached = self._summaries.get(session_id)
+        stored = (sess.get("summary") or "", sess.get("summary_upto") or 0)
+        # Whichever reaches further is newer
+        return cached if cached and cached[1] >= stored[1] else stored
+
+    def history(self, session_id: str, sess: dict, user_text: str, record: bool = True) -> List[Dict[str, str]]:
+        """
+        Chat history for the next turn: summary + recent entries + the new answer.
+        sess["transcript"] must not include user_text yet. record=False skips
+        the token stats (speculative calls).
+        """
+        transcript = sess.get("transcript", [])
+        summary, _ = self._summary(session_id, sess)
+
+        messages: List[Dict[str, str]] = []
+        if summary:
+            messages.append({"role": "system", "content": f"INTERVIEW SO FAR (summary):\n{summary}"})
+        for entry in transcript[-self.recent:]:
+            messages.append({"role": CHAT_ROLES.get(entry["role"], "user"), "content": entry["text"]})
+        messages.append({"role": "user", "content": user_text})
+
+        if record:
+            self.tokens.record(len(transcript) // 2 + 1, count_message_tokens(messages))
+        return messages
+
+    def schedule_update(self, session_id: str, transcript: List[Dict[str, Any]]):
+        """Folds entries older than the verbatim window into the summary, in the background."""
+        if len(transcript) <= self.recent:
+            return
+        if session_id in self._running:
+            # One update per session at a time; the latest transcript wins
+            self._pending[session_id] = transcript
+            return
+        task = asyncio.create_task(self._update(session_id, transcript))
+        self._running[session_id] = task
+
+    async def _update(self, session_id: str, transcript: List[Dict[str, Any]]):
+        try:
+            while transcript is not None:
+                cached = self._summaries.get(session_id)
+                if cached is None:
+                    sess = await SESSION_STORE.get_session(session_id)
+                    cached = self._summary(session_id, sess)
+                summary, upto = cached
+
+                cutoff = len(transcript) - self.recent
+                if cutoff > upto:
+                    summary = await self._summarize(summary, transcript[upto:cutoff])
+                    await SESSION_STORE.update_summary(session_id, summary, cutoff)
+                    self._remember(session_id, summary, cutoff)
+                    self.updates += 1
+                transcript = self._pending.pop(session_id, None)
+        except Exception as e:
+            self.update_failures += 1
+            logger.warning(f"Summary update failed for {session_id}: {e}")
+        finally:
+            self._running.pop(session_id, None)
+            self._pending.pop(session_id, None)
+
+    def _remember(self, session_id: str, summary: str, upto: int):
+        self._summaries[session_id] = (summary, upto)
+        self._summaries.move_to_end(session_id)
+        while len(self._summaries) > self.cache_size:
+            self._summaries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "recent_entries": self.recent,
+            "summary_updates": self.updates,
+            "summary_failures": self.update_failures,
+            "updates_in_flight": len(self._running),
+            "history_tokens_by_turn": self.tokens.stats(),
+        }
+
+
+# Singleton
+memory = ConversationMemory(summarize=gateway.summarize_conversation)
@@ -1,116 +1,311 @@
+import asyncio
+import hashlib
 import logging
 import uuid
-from typing import List, Dict, Any
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
-from fastembed import TextEmbedding
+from typing import Callable, List, Dict, Any, Tuple
 
 from app.core.config import get_settings
+from app.services.context import ContextAssembler
+from app.services.embedding_cache import QueryEmbeddingCache, ChunkEmbeddingCache
+from app.services.embeddings import create_embedder
+from app.services.vector_store import VectorHit, VectorPoint, create_vector_store
 
 settings = get_settings()
 logger = logging.getLogger("fortitwin.rag")
 
+# Namespace for deterministic point IDs (uuid5 needs a UUID namespace)
+POINT_NAMESPACE = uuid.UUID("6f1c2b8e-5d4a-4c3e-9b7a-2e8f0d1c4a5b")
+
+
+def document_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def point_id(candidate_id: str, doc_hash: str, chunk_index: int, doc_key: str = None) -> str:
+    """Same candidate + same document + same chunk always maps to the same point."""
+    scope = f"{candidate_id}:{doc_key}" if doc_key else candidate_id
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{scope}:{doc_hash}:{chunk_index}"))
+
+
+def split_lines(text: str) -> List[str]:
+    """Resume chunking: every substantial line is its own chunk."""
+    return [line for line in text.split('\n') if len(line) > 20]
+
+
+def split_paragraphs(text: str, max_chars: int = 800) -> List[str]:
+    """
+    Knowledge-base chunking: blank-line separated paragraphs, merged until
+    max_chars, with oversized paragraphs cut on whitespace.
+    """
+    chunks: List[str] = []
+    current = ""
+    for para in (p.strip() for p in text.split("\n\n")):
+        if not para:
+            continue
+        while len(para) > max_chars:
+            cut = para.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(para[:cut].strip())
+            para = para[cut:].strip()
+        if current and len(current) + len(para) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{para}" if current else para
+    if current:
+        chunks.append(current)
+    return [c for c in chunks if len(c) > 20]
+
+
 class RAGService:
     def __init__(self):
-        # 1. Connect to Qdrant (The Memory Bank)
-        # In production, use QDRANT_URL from env. For local, we default to localhost.
-        self.client = QdrantClient(url=settings.QDRANT_URL)
-        self.collection_name = "fortitwin_knowledge"
-        
-        # 2. Load Local Embedding Model (The Heavy Processor)
-        # This runs LOCALLY. No API costs. High performance.
-        logger.info("🧠 Loading FastEmbed model (this may take a moment)...")
-        self.embedding_model = TextEmbedding(model_name="BAAI/bge-small-en-v1.5")
-        logger.info("✅ Embedding model loaded.")
-
-        self._ensure_collection()
-
-    def _ensure_collection(self):
-        """Creates the vector collection if it doesn't exist."""
-        if not self.client.collection_exists(self.collection_name):
-            self.client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=models.VectorParams(
-                    size=384, # Matches BAAI/bge-small-en-v1.5 dimensions
-                    distance=models.Distance.COSINE
-                )
-            )
-            logger.info(f"✅ Created collection: {self.collection_name}")
+        # 1. Vector Store (The Memory Bank)
+        # Qdrant by default; the embedded numpy backend for single-node setups.
+        self.store = create_vector_store()
+
+        # 2. Embedding Model (The Heavy Processor)
+        # Runs LOCALLY (no API costs), either in this process or in the shared
+        # embedding server when EMBEDDING_SERVER_URL is set.
+        self.embedder = create_embedder()
+
+        # 3. Backpressure: caps how many RAG calls are in flight at once
+        self._semaphore = asyncio.Semaphore(settings.RAG_MAX_CONCURRENCY)
+
+        # 4. Query Embedding Cache
+        # Interview starts reuse a handful of query strings, so most never hit the model.
+        self.query_cache = QueryEmbeddingCache(
+            model_name=settings.EMBEDDING_MODEL,
+            max_size=settings.RAG_QUERY_CACHE_SIZE,
+            redis_url=settings.REDIS_URL if settings.RAG_QUERY_CACHE_REDIS else None,
+            ttl=settings.RAG_QUERY_CACHE_TTL,
+        )
+
+        # 5. Chunk Embedding Cache
+        # Resumes repeat a lot of boilerplate lines; only never-seen chunks hit the model.
+        self.chunk_cache = ChunkEmbeddingCache(
+            path=settings.RAG_CHUNK_CACHE_PATH,
+            model_name=settings.EMBEDDING_MODEL,
+            max_rows=settings.RAG_CHUNK_CACHE_MAX_ROWS,
+        )
+
+        # 6. Context Assembly
+        # Over-fetched hits are MMR re-ranked and packed into a token budget.
+        self.assembler = ContextAssembler(
+            budget_tokens=settings.RAG_CONTEXT_TOKENS,
+            mmr_lambda=settings.RAG_MMR_LAMBDA,
+        )
+
+    async def warmup(self):
+        """Loads the model (off-loop) or reaches the embedding server, then bootstraps the collection."""
+        await self._embed(["warmup"])
+        try:
+            await self.store.ensure()
+        except Exception as e:
+            # Not fatal: the collection is re-checked lazily on first use
+            logger.warning(f"⚠️ Vector store not reachable during warmup: {e}")
+
+    async def _embed(self, texts: List[str]) -> List[Any]:
+        return await self.embedder.embed(texts)
+
+    async def _embed_query(self, query: str) -> Any:
+        """Embeds a search query, consulting the query cache first."""
+        vector = await self.query_cache.get(query)
+        if vector is None:
+            vector = (await self._embed([query]))[0]
+            await self.query_cache.put(query, vector)
+        return vector
+
+    async def _embed_queries(self, queries: List[str]) -> List[Any]:
+        """Embeds several queries: cache hits are free, all misses share one model call."""
+        found = {q: await self.query_cache.get(q) for q in dict.fromkeys(queries)}
+        missing = [q for q, v in found.items() if v is None]
+        if missing:
+            for q, vector in zip(missing, await self._embed(missing)):
+                found[q] = vector
+                await self.query_cache.put(q, vector)
+        return [found[q] for q in queries]
+
+    async def _embed_chunks(self, chunks: List[str]) -> Tuple[List[Any], Dict[str, Any]]:
+        """
+        Embeds document chunks through the content-addressed cache.
+        Returns the vectors (in chunk order) and the cache stats for this call.
+        """
+        digests = [self.chunk_cache.digest(chunk) for chunk in chunks]
+        cached = await asyncio.to_thread(self.chunk_cache.lookup, digests)
 
-    async def ingest_document(self, text: str, metadata: Dict[str, Any]):
+        # Embed each missing chunk once, even if it repeats inside the document
+        missing = {d: chunk for d, chunk in zip(digests, chunks) if d not in cached}
+        if missing:
+            fresh = dict(zip(missing.keys(), await self._embed(list(missing.values()))))
+            await asyncio.to_thread(self.chunk_cache.store, fresh)
+            cached.update(fresh)
+
+        # Hits are distinct chunks found in the persistent cache; a line repeated
+        # inside this document is not a hit (it was embedded once, for this call)
+        unique = len(set(digests))
+        hits = unique - len(missing)
+        stats = {
+            "chunks": len(chunks),
+            "unique": unique,
+            "cache_hits": hits,
+            "embedded": len(missing),
+            "hit_ratio": round(hits / unique, 4),
+        }
+        return [cached[d] for d in digests], stats
+
+    async def has_document(self, candidate_id: str, doc_hash: str) -> bool:
+        """True if this exact document version is already ingested for the candidate."""
+        try:
+            return await self.store.count(candidate_id, doc_hash=doc_hash) > 0
+        except Exception as e:
+            logger.warning(f"Document lookup failed, assuming new: {e}")
+            return False
+
+    async def ingest_document(
+        self,
+        text: str,
+        metadata: Dict[str, Any],
+        doc_hash: str = None,
+        doc_key: str = None,
+        chunker: Callable[[str], List[str]] = split_lines,
+    ) -> Dict[str, Any]:
         """
-        Chunks text, embeds it, and stores it in Qdrant.
+        Chunks text, embeds it, and stores it in the vector store.
+        Point IDs are derived from candidate_id (+ doc_key) + doc_hash + chunk
+        index, so re-ingesting the same document overwrites instead of
+        duplicating, and points from older versions of the document are removed.
+        doc_key identifies one document when a candidate_id holds several.
+        Returns per-document stats including the chunk cache hit ratio.
         """
+        candidate_id = metadata.get("candidate_id", "anonymous")
+        doc_hash = doc_hash or document_hash(text.encode("utf-8"))
+        if doc_key:
+            metadata = {**metadata, "doc_key": doc_key}
         try:
-            # 1. Smart Chunking (Recursive is better, but splitlines works for resumes)
-            # We treat each non-empty line/paragraph as a potential chunk
-            chunks = [line for line in text.split('\n') if len(line) > 20]
-            
+            # 1. Chunking (line-based for resumes, paragraphs for knowledge docs)
+            chunks = chunker(text)
+
             if not chunks:
-                return
-
-            # 2. Embed All Chunks (Batch Processing)
-            # This uses the local CPU/GPU "Heavy" model
-            embeddings = list(self.embedding_model.embed(chunks))
-
-            # 3. Prepare Points for Qdrant
-            points = []
-            for i, (chunk, vector) in enumerate(zip(chunks, embeddings)):
-                points.append(models.PointStruct(
-                    id=str(uuid.uuid4()),
-                    vector=vector.tolist(),
-                    payload={
-                        "text": chunk,
-                        "chunk_index": i,
-                        **metadata # candidate_id, filename, etc.
-                    }
-                ))
-
-            # 4. Upload
-            self.client.upsert(
-                collection_name=self.collection_name,
-                points=points
+                return {"chunks": 0}
+
+            async with self._semaphore:
+                # 2. Embed All Chunks (Batch Processing)
+                # Cached chunks are reused; the rest go to the local model, off the event loop
+                embeddings, stats = await self._embed_chunks(chunks)
+
+                # 3. Prepare Points
+                points = [
+                    VectorPoint(
+                        id=point_id(candidate_id, doc_hash, i, doc_key),
+                        vector=vector,
+                        payload={
+                            "text": chunk,
+                            "chunk_index": i,
+                            "doc_hash": doc_hash,
+                            **metadata # candidate_id, filename, etc.
+                        },
+                    )
+                    for i, (chunk, vector) in enumerate(zip(chunks, embeddings))
+                ]
+
+                # 4. Upload
+                await self.store.upsert(points)
+
+                # 5. Replace-on-change: drop chunks from previous versions
+                # Done after the upsert so searches never see an empty profile.
+                await self.store.delete_stale(candidate_id, keep_hash=doc_hash, doc_key=doc_key)
+            logger.info(
+                f"💾 Ingested {len(points)} chunks for {metadata.get('filename')} "
+                f"(chunk cache hit ratio {stats['hit_ratio']:.0%})"
             )
-            logger.info(f"💾 Ingested {len(points)} chunks for {metadata.get('filename')}")
+            return {**stats, "doc_hash": doc_hash}
 
         except Exception as e:
             logger.error(f"❌ Ingestion failed: {e}")
+            return {"error": str(e)}
+
+    async def delete_document(self, candidate_id: str, doc_key: str = None):
+        """Removes every point of a document (or of the whole candidate)."""
+        await self.store.delete_stale(candidate_id, keep_hash=None, doc_key=doc_key)
 
     async def search(self, query: str, limit: int = 3, candidate_id: str = None) -> str:
         """
         Retrieves relevant context for a query.
         """
         try:
-            # 1. Embed the Query
-            query_vec = list(self.embedding_model.embed([query]))[0]
-
-            # 2. Define Filters (Only search THIS candidate's resume)
-            query_filter = None
-            if candidate_id:
-                query_filter = models.Filter(
-                    must=[
-                        models.FieldCondition(
-                            key="candidate_id",
-                            match=models.MatchValue(value=candidate_id)
-                        )
-                    ]
+            async with self._semaphore:
+                # 1. Embed the Query
+                query_vec = await self._embed_query(query)
+
+                # 2. Search (filtered to THIS candidate's resume)
+                # Over-fetch with vectors so near-duplicate lines can be dropped
+                hits = await self.store.search(
+                    query_vec,
+                    limit=limit * settings.RAG_OVERFETCH,
+                    candidate_id=candidate_id,
+                    with_vectors=True,
                 )
 
-            # 3. Search Qdrant
-            hits = self.client.search(
-                collection_name=self.collection_name,
-                query_vector=query_vec.tolist(),
-                query_filter=query_filter,
-                limit=limit
+            # 3. Construct Context String (MMR re-rank, then pack into the token budget)
+            return self.assembler.assemble([query_vec], hits, k=limit)
+
+        except Exception as e:
+            logger.error(f"❌ Search failed: {e}")
+            return ""
+
+    async def search_hits(
+        self, queries: List[str], limit: int = 3, candidate_id: str = None, with_vectors: bool = False
+    ) -> Tuple[List[Any], List[VectorHit]]:
+        """
+        Multi-query retrieval: one batched embedding + one batched vector search.
+        Hits are merged across queries, deduplicated by point (best score wins)
+        and returned best-first, together with the query vectors.
+        """
+        async with self._semaphore:
+            vectors = await self._embed_queries(queries)
+            per_query = await self.store.search_batch(
+                vectors, limit=limit, candidate_id=candidate_id, with_vectors=with_vectors
             )
 
-            # 4. Construct Context String
-            context_text = "\n---\n".join([hit.payload["text"] for hit in hits])
-            return context_text
+        best: Dict[str, VectorHit] = {}
+        for hits in per_query:
+            for hit in hits:
+                if hit.id not in best or hit.score > best[hit.id].score:
+                    best[hit.id] = hit
+        return vectors, sorted(best.values(), key=lambda h: h.score, reverse=True)
 
+    async def search_batch(
+        self, queries: List[str], limit: int = 3, candidate_id: str = None, max_results: int = 8
+    ) -> str:
+        """
+        Retrieves context for several queries at once (see search_hits).
+        """
+        try:
+            vectors, hits = await self.search_hits(
+                queries, limit=limit * settings.RAG_OVERFETCH, candidate_id=candidate_id, with_vectors=True
+            )
+            # Relevance is the best match against any of the queries
+            return self.assembler.assemble(vectors, hits, k=max_results)
         except Exception as e:
-            logger.error(f"❌ Search failed: {e}")
+            logger.error(f"❌ Batch search failed: {e}")
             return ""
 
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "store": self.store.stats(),
+            "embedder": self.embedder.stats(),
+            "query_cache": self.query_cache.stats(),
+            "chunk_cache": self.chunk_cache.stats(),
+        }
+
+    async def close(self):
+        """Releases the vector store and the embedder."""
+        await self.store.close()
+        await self.query_cache.close()
+        await self.embedder.close()
+        self.chunk_cache.close()
+
 # Singleton
-rag = RAGService()
\ No newline at end of file
+rag = RAGService()
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import redis.asyncio as aioredis
+
+from app.core.config import get_settings
+from app.services.resilience import LatencyTracker, TokenBucket
+
+settings = get_settings()
+logger = logging.getLogger("fortitwin.rate_limit")
+
+# Priority classes (lower = served first)
+LIVE = 0  # A candidate is waiting on this call
+BACKGROUND = 1  # Scoring, summaries, resume analysis: may queue
+PRIORITY_NAMES = {LIVE: "live", BACKGROUND: "background"}
+
+# Seconds between re-checks while waiting (a token may be freed earlier elsewhere)
+MAX_POLL = 0.5
+REDIS_RETRY = 30.0  # Seconds on the local bucket after a Redis error
+
+# Shared token bucket. KEYS[1] = bucket hash; ARGV = rate (tokens/s), burst, reserve.
+# Takes a token only if `reserve` tokens remain afterwards (background calls
+# leave headroom for live ones). Returns 0 when granted, else ms to wait.
+# Uses the Redis clock, so every process agrees on refill time.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+
+local wait = 0
+if tokens >= 1 + reserve then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 + reserve - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return wait
+"""
+
+
+class ModelLimiter:
+    """
+    Admission control for one provider/model quota.
+    The bucket lives in Redis so the API and the workers share it; on a Redis
+    error the process falls back to a local bucket for REDIS_RETRY seconds.
+    Live calls may drain the bucket, background calls must leave `reserve`
+    tokens, and within a process background waiters also stand aside while
+    any live caller is queued. Waiters of the same class are served FIFO.
+    """
+
+    def __init__(self, key: str, rpm: int, burst: int, reserve: int, script: Optional[Any] = None):
+        self.key = key
+        self.rate = rpm / 60.0
+        self.burst = max(1, burst)
+        self.reserve = max(0, min(reserve, self.burst - 1))
+        self._script = script
+        self._local = TokenBucket(key, self.rate, self.burst)
+        self._redis_down_until = 0.0
+        self._queues = {p: asyncio.Lock() for p in PRIORITY_NAMES}
+        self.waiting = {p: 0 for p in PRIORITY_NAMES}
+        self.waits = {p: LatencyTracker() for p in PRIORITY_NAMES}
+
+    @property
+    def shared(self) -> bool:
+        return self._script is not None and time.monotonic() >= self._redis_down_until
+
+    async def _take(self, priority: int) -> float:
+        reserve = 0 if priority == LIVE else self.reserve
+        if self.shared:
+            try:
+                ms = await self._script(keys=[f"ratelimit:{self.key}"], args=[self.rate, self.burst, reserve])
+                return int(ms) / 1000.0
+            except Exception as e:
+                logger.warning(f"Shared rate limit unavailable for {self.key}, limiting locally: {e}")
+                self._redis_down_until = time.monotonic() + REDIS_RETRY
+        return self._local.take(reserve)
+
+    async def acquire(self, priority: int = LIVE) -> float:
+        """Waits for a token; returns the seconds spent queued."""
+        start = time.monotonic()
+        self.waiting[priority] += 1
+        try:
+            async with self._queues[priority]:
+                while True:
+                    if priority != LIVE and self.waiting[LIVE]:
+                        await asyncio.sleep(MAX_POLL / 10)
+                        continue
+                    wait = await self._take(priority)
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(min(wait, MAX_POLL))
+        finally:
+            self.waiting[priority] -= 1
+        waited = time.monotonic() - start
+        self.waits[priority].record(waited)
+        return waited
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate_per_min": round(self.rate * 60, 1),
+            "burst": self.burst,
+            "shared": self.shared,
+            "queued": {name: self.waiting[p] for p, name in PRIORITY_NAMES.items()},
+            "wait": {name: self.waits[p].stats() for p, name in PRIORITY_NAMES.items()},
+        }
+
+
+class RateLimiter:
+    """
+    Per provider/model limiters, created on first use. `quotas` maps a
+    provider name to its per-model requests per minute; 0 or missing means
+    calls to that provider are not limited.
+    """
+
+    def __init__(
+        self,
+        quotas: Dict[str, int],
+        burst: int = settings.LLM_RATE_BURST,
+        reserve: int = settings.LLM_RATE_LIVE_RESERVE,
+        redis_url: Optional[str] = None,
+    ):
+        self.quotas = quotas
+        self.burst = burst
+        self.reserve = reserve
+        self._redis = aioredis.from_url(redis_url) if redis_url else None
+        self._script = self._redis.register_script(TOKEN_BUCKET_LUA) if self._redis else None
+        self._limiters: Dict[str, ModelLimiter] = {}
+
+    def limiter(self, provider: str, model: str) -> Optional[ModelLimiter]:
+        rpm = self.quotas.get(provider, 0)
+        if not rpm:
+            return None
+        key = f"{provider}/{model}"
+        if key not in self._limiters:
+            self._limiters[key] = ModelLimiter(key, rpm, self.burst, self.reserve, self._script)
+        return self._limiters[key]
+
+    async def acquire(self, provider: str, model: str, priority: int = LIVE) -> float:
+        limiter = self.limiter(provider, model)
+        if limiter is None:
+            return 0.0
+        return await limiter.acquire(priority)
+
+    def stats(self) -> Dict[str, Any]:
+        return {key: limiter.stats() for key, limiter in self._limiters.items()}
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.close()
@@ -0,0 +1,124 @@
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger("fortitwin.resilience")
+
+
+class LatencyTracker:
+    """Rolling window of call latencies (seconds) with quantile lookups."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+        self.count += 1
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        return float(np.quantile(np.fromiter(self._samples, dtype=np.float64), q))
+
+    def p50(self) -> Optional[float]:
+        return self.quantile(0.50)
+
+    def p95(self) -> Optional[float]:
+        return self.quantile(0.95)
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = self.p50(), self.p95()
+        return {
+            "calls": self.count,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker.
+    closed -> open after `failure_threshold` failures in a row; open rejects
+    calls until `reset_timeout` has passed, then lets a single probe through
+    (half_open). The probe's outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        # Open, or a half-open probe is already in flight
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"🟢 Circuit {self.name} closed")
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def release(self):
+        """A half-open probe was abandoned (e.g. lost a hedge): allow the next probe."""
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+                logger.warning(f"🔴 Circuit {self.name} open after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures, "trips": self.trips}
+
+
+class TokenBucket:
+    """
+    In-process token bucket: `rate` tokens per second, bursts of up to
+    `burst`. take() never blocks; it says how long to wait instead.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int = 1):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    def take(self, reserve: int = 0) -> float:
+        """
+        Takes a token if at least `reserve` would remain afterwards.
+        Returns 0.0 on success, else the seconds until that becomes possible.
+        """
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        needed = 1 + reserve
+        if self._tokens >= needed:
+            self._tokens -= 1
+            return 0.0
+        return (needed - self._tokens) / self.rate
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import redis.asyncio as aioredis
+
+from app.services.embedding_cache import normalize_query
+
+logger = logging.getLogger("fortitwin.response_cache")
+
+# Call types whose answers depend on the whole transcript; never served from cache.
+NEVER_CACHED = frozenset({"scoring", "scoring_segment"})
+
+EmbedFn = Callable[[List[str]], Awaitable[List[Any]]]
+
+
+def normalize_messages(messages: List[Dict[str, str]]) -> List[Tuple[str, str]]:
+    return [(m.get("role", ""), normalize_query(m.get("content") or "")) for m in messages]
+
+
+class ResponseCache:
+    """
+    Cache for deterministic gateway calls (same prompt -> reusable answer).
+
+    Exact tier: sha256 of the normalized messages, in an in-process LRU with
+    per-entry TTL, optionally backed by Redis so every worker shares hits.
+    Semantic tier (optional): prompts with the same leading system message
+    (company + role) are compared by embedding; a cosine above the threshold
+    reuses the nearest entry's exact key. Vectors stay in-process.
+    """
+
+    def __init__(
+        self,
+        call_types: Iterable[str],
+        max_size: int = 1024,
+        ttl: int = 3600,
+        redis_url: Optional[str] = None,
+        embed: Optional[EmbedFn] = None,
+        similarity: float = 0.97,
+    ):
+        self.call_types = frozenset(call_types) - NEVER_CACHED
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self._embed = embed
+        self._lru: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # (call_type, scope) -> {exact key: (expires_at, unit vector)}
+        self._semantic: Dict[Tuple[str, str], "OrderedDict[str, Tuple[float, np.ndarray]]"] = {}
+        self._redis = aioredis.from_url(redis_url) if redis_url else None
+
+        self.hits = 0
+        self.redis_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def enabled_for(self, call_type: str) -> bool:
+        return call_type in self.call_types
+
+    # --- keys ---
+
+    def _key(self, call_type: str, messages: List[Dict[str, str]]) -> str:
+        payload = json.dumps(normalize_messages(messages), separators=(",", ":"))
+        return f"llmresp:{call_type}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def _scope(messages: List[Dict[str, str]]) -> str:
+        head = normalize_query(messages[0].get("content") or "") if messages else ""
+        return hashlib.sha1(head.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _semantic_text(messages: List[Dict[str, str]]) -> str:
+        return "\n".join(m.get("content") or "" for m in messages[1:])
+
+    async def _vector(self, messages: List[Dict[str, str]]) -> Optional[np.ndarray]:
+        try:
+            vector = np.asarray((await self._embed([self._semantic_text(messages)]))[0], dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Semantic cache embedding failed: {e}")
+            return None
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    @staticmethod
+    def _prune(index: "OrderedDict[str, Tuple[float, np.ndarray]]"):
+        now = time.time()
+        for stale in [k for k, (exp, _) in index.items() if exp <= now]:
+            del index[stale]
+
+    # --- exact tier ---
+
+    def _remember(self, key: str, value: Dict[str, Any], expires_at: float):
+        self._lru[key] = (expires_at, value)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    async def _lookup(self, key: str, count: bool = True) -> Optional[Dict[str, Any]]:
+        entry = self._lru.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._lru.move_to_end(key)
+                self.hits += count
+                return entry[1]
+            del self._lru[key]
+
+        if self._redis is not None:
+            try:
+                raw = await self._redis.get(key)
+            except Exception as e:
+                logger.warning(f"Redis response cache unavailable: {e}")
+                raw = None
+            if raw:
+                value = json.loads(raw)
+                self._remember(key, value, time.time() + self.ttl)
+                self.redis_hits += count
+                return value
+        return None
+
+    # --- public API ---
+
+    async def get(self, call_type: str, messages: List[Dict[str, str]]) -> Optional[Dict[str, Any]]:
+        key = self._key(call_type, messages)
+        value = await self._lookup(key)
+        if value is not None:
+            return value
+
+        if self._embed is not None:
+            index = self._semantic.get((call_type, self._scope(messages)))
+            if index:
+                self._prune(index)
+                if index:
+                    vector = await self._vector(messages)
+                    if vector is not None:
+                        keys = list(index.keys())
+                        scores = np.stack([v for _, v in index.values()]) @ vector
+                        best = int(np.argmax(scores))
+                        if scores[best] >= self.similarity:
+                            value = await self._lookup(keys[best], count=False)
+                            if value is not None:
+                                self.semantic_hits += 1
+                                return value
+
+        self.misses += 1
+        return None
+
+    async def put(self, call_type: str, messages: List[Dict[str, str]], value: Dict[str, Any]):
+        if not self.enabled_for(call_type):
+            return
+        key = self._key(call_type, messages)
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+
+        if self._redis is not None:
+            try:
+                await self._redis.set(key, json.dumps(value), ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"Redis response cache write failed: {e}")
+
+        if self._embed is not None:
+            vector = await self._vector(messages)
+            if vector is not None:
+                index = self._semantic.setdefault((call_type, self._scope(messages)), OrderedDict())
+                self._prune(index)
+                index[key] = (expires_at, vector)
+                index.move_to_end(key)
+                while len(index) > self.max_size:
+                    index.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.redis_hits + self.semantic_hits + self.misses
+        return {
+            "call_types": sorted(self.call_types),
+            "size": len(self._lru),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_ratio": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+        }
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.close()
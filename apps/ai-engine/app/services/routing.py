@@ -0,0 +1,161 @@
+import logging
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.rate_limit import BACKGROUND, LIVE
+
+settings = get_settings()
+logger = logging.getLogger("fortitwin.routing")
+
+LARGE_GROQ = "llama-3.3-70b-versatile"
+SMALL_GROQ = "llama-3.1-8b-instant"
+
+
+class Tier(NamedTuple):
+    provider: str  # Gateway provider name ("groq" | "openai")
+    model: str
+
+
+class CallPolicy(NamedTuple):
+    slo: float  # Latency budget in seconds (p95) for this call type
+    tiers: List[Tier]  # Preferred first; later tiers are the degraded options
+    priority: int = LIVE  # Rate-limit class (see services/rate_limit.py)
+
+
+# Voice turns are measured to the first streamed text, everything else to the full answer.
+POLICIES: Dict[str, CallPolicy] = {
+    "opening": CallPolicy(settings.LLM_SLO_TEXT_TURN, [Tier("groq", LARGE_GROQ), Tier("groq", SMALL_GROQ), Tier("openai", "gpt-3.5-turbo")]),
+    "voice_turn": CallPolicy(settings.LLM_SLO_VOICE_TURN, [Tier("groq", LARGE_GROQ), Tier("groq", SMALL_GROQ), Tier("openai", "gpt-3.5-turbo")]),
+    "text_turn": CallPolicy(settings.LLM_SLO_TEXT_TURN, [Tier("groq", LARGE_GROQ), Tier("groq", SMALL_GROQ), Tier("openai", "gpt-3.5-turbo")]),
+    "scoring": CallPolicy(settings.LLM_SLO_SCORING, [Tier("openai", "gpt-4o"), Tier("groq", LARGE_GROQ)], BACKGROUND),
+    "scoring_segment": CallPolicy(settings.LLM_SLO_SCORING_SEGMENT, [Tier("groq", LARGE_GROQ), Tier("openai", "gpt-4o")], BACKGROUND),
+    "summary": CallPolicy(settings.LLM_SLO_SUMMARY, [Tier("groq", SMALL_GROQ), Tier("groq", LARGE_GROQ), Tier("openai", "gpt-3.5-turbo")], BACKGROUND),
+}
+
+
+class ModelWindow:
+    """Time-bounded window of (timestamp, seconds, ok) samples for one call type + model."""
+
+    def __init__(self, window_s: float, max_samples: int = 500):
+        self.window_s = window_s
+        self._samples: Deque[Tuple[float, float, bool]] = deque(maxlen=max_samples)
+
+    def record(self, seconds: float, ok: bool):
+        self._samples.append((time.monotonic(), seconds, ok))
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.window_s
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+
+    def __len__(self) -> int:
+        self._prune()
+        return len(self._samples)
+
+    def p95(self) -> Optional[float]:
+        self._prune()
+        ok = [s for _, s, good in self._samples if good]
+        return float(np.quantile(ok, 0.95)) if ok else None
+
+    def error_rate(self) -> float:
+        self._prune()
+        if not self._samples:
+            return 0.0
+        return sum(1 for _, _, good in self._samples if not good) / len(self._samples)
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "samples": len(self),
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate(), 3),
+        }
+
+
+class RoutingPolicy:
+    """
+    Picks the model for each call type from its tier list.
+    The first tier whose rolling p95 fits the SLO and whose error rate is
+    acceptable wins; a tier with too few recent samples counts as healthy,
+    so a degraded model gets retried once its bad samples age out of the
+    window. If every tier is breaching, the one with the lowest p95 is used.
+    """
+
+    def __init__(
+        self,
+        policies: Dict[str, CallPolicy] = POLICIES,
+        window_s: float = settings.LLM_ROUTING_WINDOW,
+        min_samples: int = settings.LLM_ROUTING_MIN_SAMPLES,
+        max_error_rate: float = settings.LLM_ROUTING_MAX_ERROR_RATE,
+    ):
+        self.policies = policies
+        self.window_s = window_s
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self._windows: Dict[Tuple[str, Tier], ModelWindow] = {}
+        self._served: Dict[str, Counter] = {name: Counter() for name in policies}
+        self._degraded: Counter = Counter()
+
+    def window(self, call_type: str, tier: Tier) -> ModelWindow:
+        key = (call_type, tier)
+        if key not in self._windows:
+            self._windows[key] = ModelWindow(self.window_s)
+        return self._windows[key]
+
+    def _healthy(self, call_type: str, tier: Tier) -> bool:
+        window = self.window(call_type, tier)
+        if len(window) < self.min_samples:
+            return True
+        p95 = window.p95()
+        return (p95 is None or p95 <= self.policies[call_type].slo) and window.error_rate() <= self.max_error_rate
+
+    def plan(self, call_type: str, providers: Iterable[str]) -> List[Tier]:
+        """
+        Ordered tiers to try for a call: the routed tier first, then the
+        remaining tiers as fallbacks. Only tiers whose provider is configured.
+        """
+        available = set(providers)
+        tiers = [t for t in self.policies[call_type].tiers if t.provider in available]
+        if not tiers:
+            return []
+
+        chosen = next((t for t in tiers if self._healthy(call_type, t)), None)
+        if chosen is None:
+            chosen = min(tiers, key=lambda t: self.window(call_type, t).p95() or float("inf"))
+        if chosen != tiers[0]:
+            self._degraded[call_type] += 1
+            logger.info(f"🔀 {call_type}: {tiers[0].model} over budget, routing to {chosen.model}")
+        return [chosen] + [t for t in tiers if t != chosen]
+
+    def priority(self, call_type: str) -> int:
+        return self.policies[call_type].priority
+
+    def record(self, call_type: str, tier: Tier, seconds: float, ok: bool = True):
+        self.window(call_type, tier).record(seconds, ok)
+        if ok:
+            # Counted where the answer came from, not where plan() pointed:
+            # an open breaker or a winning hedge serves from another tier.
+            self._served[call_type][f"{tier.provider}/{tier.model}"] += 1
+
+    def p95(self, call_type: str, tier: Tier) -> Optional[float]:
+        """Rolling p95 once there are enough samples to trust it."""
+        window = self.window(call_type, tier)
+        return window.p95() if len(window) >= self.min_samples else None
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for call_type, policy in self.policies.items():
+            out[call_type] = {
+                "slo_ms": round(policy.slo * 1000),
+                "served": dict(self._served[call_type]),
+                "degraded": self._degraded[call_type],
+                "models": {
+                    f"{tier.provider}/{tier.model}": self.window(call_type, tier).stats()
+                    for tier in policy.tiers
+                },
+            }
+        return out
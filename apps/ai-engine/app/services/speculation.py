@@ -0,0 +1,151 @@
+import asyncio
+import difflib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.config import get_settings
+from app.services.resilience import LatencyTracker
+
+settings = get_settings()
+logger = logging.getLogger("fortitwin.speculation")
+
+
+def similarity(a: str, b: str) -> float:
+    """Case/whitespace-insensitive similarity ratio in [0, 1]."""
+    a, b = " ".join(a.lower().split()), " ".join(b.lower().split())
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+class SpeculationStats:
+    """Process-wide counters, plus end-of-speech -> first reply latency by outcome."""
+
+    def __init__(self):
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self.reply_latency: Dict[str, LatencyTracker] = {
+            "hit": LatencyTracker(),  # Speculative reply reused
+            "miss": LatencyTracker(),  # Speculated, but regenerated
+            "none": LatencyTracker(),  # No speculation in flight
+        }
+
+    def record_reply(self, outcome: str, seconds: float):
+        self.reply_latency[outcome].record(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        resolved = self.hits + self.misses
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / resolved, 4) if resolved else 0.0,
+            "saved_ms_total": round(self.saved_ms, 1),
+            "saved_ms_avg": round(self.saved_ms / self.hits, 1) if self.hits else 0.0,
+            "reply_latency": {k: v.stats() for k, v in self.reply_latency.items()},
+        }
+
+
+speculation_stats = SpeculationStats()
+
+
+def _discard(task: Optional[asyncio.Task]):
+    """Cancels a task, or retrieves its exception if it already finished."""
+    if task is None:
+        return
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        task.exception()
+
+
+class Speculator:
+    """
+    Per-connection speculative reply generation.
+
+    on_partial() is fed the live partial transcript; once it has stopped
+    changing for stable_ms (and is long enough), generate(text) starts in the
+    background. resolve(final_text) reuses that result when the final
+    transcript is similar enough, and otherwise cancels it and returns None
+    so the caller generates normally.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str], Awaitable[Any]],
+        stats: SpeculationStats = speculation_stats,
+        stable_ms: float = settings.VOICE_SPECULATION_STABLE_MS,
+        min_chars: int = settings.VOICE_SPECULATION_MIN_CHARS,
+        threshold: float = settings.VOICE_SPECULATION_SIMILARITY,
+    ):
+        self._generate = generate
+        self.stats = stats
+        self.stable_s = stable_ms / 1000.0
+        self.min_chars = min_chars
+        self.threshold = threshold
+        self._timer: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self._text = ""
+        self._started = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self._task is not None
+
+    def on_partial(self, text: str):
+        text = text.strip()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if len(text) >= self.min_chars:
+            self._timer = asyncio.create_task(self._start_when_stable(text))
+
+    async def _start_when_stable(self, text: str):
+        await asyncio.sleep(self.stable_s)
+        if self._task is not None and similarity(self._text, text) >= self.threshold:
+            return  # The running speculation still matches
+        _discard(self._task)
+        self._text = text
+        self._started = time.monotonic()
+        self._task = asyncio.create_task(self._run(text))
+        self.stats.started += 1
+
+    async def _run(self, text: str) -> Tuple[Any, float]:
+        result = await self._generate(text)
+        return result, time.monotonic()
+
+    async def resolve(self, final_text: str) -> Optional[Any]:
+        """The speculative result if it can stand in for final_text, else None."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task, self._task = self._task, None
+        if task is None:
+            return None
+
+        score = similarity(self._text, final_text)
+        if score < self.threshold:
+            _discard(task)
+            self.stats.misses += 1
+            logger.info(f"🎲 Speculation miss (similarity {score:.2f})")
+            return None
+
+        ahead = time.monotonic() - self._started
+        try:
+            result, finished = await task
+        except Exception as e:
+            self.stats.misses += 1
+            logger.warning(f"Speculative generation failed: {e}")
+            return None
+
+        # Saved = the part of the generation that ran before the final transcript arrived
+        self.stats.hits += 1
+        self.stats.saved_ms += min(ahead, finished - self._started) * 1000
+        return result
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        _discard(self._task)
+        self._task = None
@@ -0,0 +1,634 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http import models
+
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger("fortitwin.vector_store")
+
+EMBEDDING_DIM = 384  # Matches BAAI/bge-small-en-v1.5 dimensions
+
+
+class VectorPoint(NamedTuple):
+    id: str
+    vector: Any  # 1-D float array
+    payload: Dict[str, Any]
+
+
+class VectorHit(NamedTuple):
+    id: str
+    score: float
+    payload: Dict[str, Any]
+    vector: Any = None  # Only filled when the search asked for vectors
+
+
+class VectorStore:
+    """
+    Storage backend behind RAGService.
+    Every point carries candidate_id and doc_hash in its payload; the
+    interface is shaped around per-candidate documents.
+    """
+
+    name = "base"
+
+    async def ensure(self):
+        """Creates/opens the underlying collection."""
+
+    async def upsert(self, points: List[VectorPoint]):
+        raise NotImplementedError
+
+    async def count(self, candidate_id: str, doc_hash: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    async def delete_stale(self, candidate_id: str, keep_hash: Optional[str], doc_key: Optional[str] = None):
+        """
+        Deletes the candidate's points whose doc_hash differs from keep_hash
+        (all of them if keep_hash is None). doc_key narrows the scope to one
+        document when a candidate_id holds several (e.g. the knowledge base).
+        """
+        raise NotImplementedError
+
+    async def search(
+        self, vector, limit: int, candidate_id: Optional[str] = None, with_vectors: bool = False
+    ) -> List[VectorHit]:
+        raise NotImplementedError
+
+    async def search_batch(
+        self, vectors, limit: int, candidate_id: Optional[str] = None, with_vectors: bool = False
+    ) -> List[List[VectorHit]]:
+        """One result list per query vector. Backends override this with a single round trip."""
+        return list(await asyncio.gather(*(self.search(v, limit, candidate_id, with_vectors) for v in vectors)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+    async def close(self):
+        pass
+
+
+# -------------------------------------------------------------------
+# 1. QDRANT BACKEND (network, multi-node)
+# -------------------------------------------------------------------
+class QdrantVectorStore(VectorStore):
+    name = "qdrant"
+
+    # Keyword indexes so filtered searches/deletes don't scan the collection
+    INDEXED_FIELDS = ("candidate_id", "filename", "doc_hash", "doc_key")
+
+    def __init__(
+        self,
+        url: str = settings.QDRANT_URL,
+        collection_name: str = "fortitwin_knowledge",
+        quantization: bool = settings.QDRANT_QUANTIZATION,
+        on_disk: bool = settings.QDRANT_ON_DISK,
+    ):
+        # Async client so network round trips never block the event loop.
+        self.client = AsyncQdrantClient(url=url)
+        self.collection_name = collection_name
+        self.quantization = quantization
+        self.on_disk = on_disk
+        self._ready = False
+        self._lock = asyncio.Lock()
+
+    def _quantization_config(self) -> models.ScalarQuantization:
+        # int8 copies stay in RAM for scoring; originals are used for rescoring
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True,
+            )
+        )
+
+    async def ensure(self):
+        """Creates the vector collection if it doesn't exist, then migrates it to the configured layout."""
+        if self._ready:
+            return
+        async with self._lock:
+            if self._ready:
+                return
+            if not await self.client.collection_exists(self.collection_name):
+                await self.client.create_collection(
+                    collection_name=self.collection_name,
+                    vectors_config=models.VectorParams(
+                        size=EMBEDDING_DIM,
+                        distance=models.Distance.COSINE,
+                        on_disk=self.on_disk,
+                    ),
+                    quantization_config=self._quantization_config() if self.quantization else None,
+                )
+                logger.info(f"✅ Created collection: {self.collection_name}")
+            await self._migrate()
+            self._ready = True
+
+    async def _migrate(self):
+        """Brings an existing collection up to date: payload indexes, quantization, on-disk vectors."""
+        info = await self.client.get_collection(self.collection_name)
+
+        for field in self.INDEXED_FIELDS:
+            if field not in (info.payload_schema or {}):
+                await self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field,
+                    field_schema=models.PayloadSchemaType.KEYWORD,
+                )
+                logger.info(f"🗂️ Created payload index on {field}")
+
+        if self.quantization and info.config.quantization_config is None:
+            await self.client.update_collection(
+                collection_name=self.collection_name,
+                quantization_config=self._quantization_config(),
+            )
+            logger.info("🗜️ Enabled int8 scalar quantization")
+
+        vectors = info.config.params.vectors
+        if self.on_disk and isinstance(vectors, models.VectorParams) and not vectors.on_disk:
+            await self.client.update_collection(
+                collection_name=self.collection_name,
+                vectors_config={"": models.VectorParamsDiff(on_disk=True)},
+            )
+            logger.info("💽 Moved original vectors on disk")
+
+    def _search_params(self) -> Optional[models.SearchParams]:
+        if not self.quantization:
+            return None
+        # Score on int8, then rescore the oversampled top hits with the originals
+        return models.SearchParams(
+            quantization=models.QuantizationSearchParams(rescore=True, oversampling=2.0)
+        )
+
+    def _candidate_filter(
+        self, candidate_id: str, doc_hash: str = None, exclude_hash: str = None, doc_key: str = None
+    ) -> models.Filter:
+        must = [models.FieldCondition(key="candidate_id", match=models.MatchValue(value=candidate_id))]
+        if doc_hash:
+            must.append(models.FieldCondition(key="doc_hash", match=models.MatchValue(value=doc_hash)))
+        if doc_key:
+            must.append(models.FieldCondition(key="doc_key", match=models.MatchValue(value=doc_key)))
+        must_not = None
+        if exclude_hash:
+            must_not = [models.FieldCondition(key="doc_hash", match=models.MatchValue(value=exclude_hash))]
+        return models.Filter(must=must, must_not=must_not)
+
+    async def upsert(self, points: List[VectorPoint]):
+        await self.ensure()
+        await self.client.upsert(
+            collection_name=self.collection_name,
+            points=[
+                models.PointStruct(id=p.id, vector=np.asarray(p.vector).tolist(), payload=p.payload)
+                for p in points
+            ],
+        )
+
+    async def count(self, candidate_id: str, doc_hash: Optional[str] = None) -> int:
+        await self.ensure()
+        result = await self.client.count(
+            collection_name=self.collection_name,
+            count_filter=self._candidate_filter(candidate_id, doc_hash=doc_hash),
+            exact=True,
+        )
+        return result.count
+
+    async def delete_stale(self, candidate_id: str, keep_hash: Optional[str], doc_key: Optional[str] = None):
+        await self.ensure()
+        await self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(
+                filter=self._candidate_filter(candidate_id, exclude_hash=keep_hash, doc_key=doc_key)
+            ),
+        )
+
+    @staticmethod
+    def _to_hit(h) -> VectorHit:
+        return VectorHit(id=str(h.id), score=h.score, payload=h.payload, vector=h.vector)
+
+    async def search(
+        self, vector, limit: int, candidate_id: Optional[str] = None, with_vectors: bool = False
+    ) -> List[VectorHit]:
+        await self.ensure()
+        hits = await self.client.search(
+            collection_name=self.collection_name,
+            query_vector=np.asarray(vector).tolist(),
+            query_filter=self._candidate_filter(candidate_id) if candidate_id else None,
+            search_params=self._search_params(),
+            limit=limit,
+            with_vectors=with_vectors,
+        )
+        return [self._to_hit(h) for h in hits]
+
+    async def search_batch(
+        self, vectors, limit: int, candidate_id: Optional[str] = None, with_vectors: bool = False
+    ) -> List[List[VectorHit]]:
+        await self.ensure()
+        query_filter = self._candidate_filter(candidate_id) if candidate_id else None
+        results = await self.client.search_batch(
+            collection_name=self.collection_name,
+            requests=[
+                models.SearchRequest(
+                    vector=np.asarray(v).tolist(),
+                    filter=query_filter,
+                    params=self._search_params(),
+                    limit=limit,
+                    with_payload=True,
+                    with_vector=with_vectors,
+                )
+                for v in vectors
+            ],
+        )
+        return [[self._to_hit(h) for h in hits] for hits in results]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "collection": self.collection_name,
+            "quantization": self.quantization,
+            "on_disk": self.on_disk,
+        }
+
+    async def close(self):
+        await self.client.close()
+
+
+# -------------------------------------------------------------------
+# 2. EMBEDDED NUMPY BACKEND (single node, tests, CLI)
+# -------------------------------------------------------------------
+class NumpyVectorStore(VectorStore):
+    """
+    In-process store: vectors live in a memory-mapped float32 matrix
+    (vectors.f32), payloads and deletions in an append-only log (log.jsonl).
+    Vectors are L2-normalized on insert, so cosine similarity is one
+    matrix-vector product. A candidate_id -> row index keeps per-candidate
+    searches proportional to that candidate's chunks. Rows are never
+    rewritten in place: updates append a new row and tombstone the old one.
+
+    Several processes may share one directory (API + ARQ worker on a node).
+    The log is the source of truth for row numbers: a row is the position of
+    its put in the log. Writers hold an exclusive flock on .lock while they
+    catch up on the log, allocate rows, write vectors and append; readers
+    re-read the log tail whenever its size changed. Only writers grow the
+    matrix file.
+
+    Tombstoned rows are reclaimed by compact(), which runs on its own once
+    more than VECTOR_COMPACT_RATIO of the rows are dead: under the exclusive
+    lock it copies the live rows to a new matrix file and atomically
+    replaces the log with one put per live row, headed by a "gen" record
+    naming that file. The log rename is the only commit point. Other
+    processes notice the new log inode on their next tail and reload.
+    """
+
+    name = "numpy"
+    COMPACT_MIN_ROWS = 1024  # Smaller stores aren't worth rewriting
+
+    def __init__(self, path: str = settings.VECTOR_STORE_DIR, dim: int = EMBEDDING_DIM):
+        self.path = os.path.abspath(path)
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._opened = False
+
+    # --- persistence ---
+
+    def _open(self):
+        if self._opened:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        self._log_path = os.path.join(self.path, "log.jsonl")
+        self._lock_file = open(os.path.join(self.path, ".lock"), "a")
+        self._log = None
+        self._log_ino = None  # Identifies the log generation this index was built from
+
+        with self._file_lock(fcntl.LOCK_EX):
+            # Exists from here on, so its inode can tell generations apart
+            open(self._log_path, "a").close()
+            self._tail(locked=True)
+            self._grow(1024)
+        self._opened = True
+        logger.info(f"📂 Opened vector store at {self.path} ({self.live_count()} live points)")
+
+    @contextmanager
+    def _file_lock(self, mode: int):
+        fcntl.flock(self._lock_file.fileno(), mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _reset(self, log_ino: int):
+        """Drops the index before (re)loading a log generation from its start."""
+        self._ids: List[str] = []
+        self._payloads: List[Dict[str, Any]] = []
+        self._alive: List[bool] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._by_candidate: Dict[str, List[int]] = {}
+        self._alive_mask = None  # numpy view of _alive, rebuilt lazily
+        self._log_offset = 0  # Bytes of log.jsonl applied to the index
+        self._vec_path = os.path.join(self.path, "vectors.f32")  # Logs without a "gen" record
+        self._vecs = None
+        self._capacity = 0
+        self._log_ino = log_ino
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self._log_path, "a", encoding="utf-8")
+
+    def _tail(self, locked: bool = False):
+        """
+        Applies log records appended since the last call (by any process),
+        reloading from scratch if the log was replaced by a compaction.
+        locked=True: the caller already holds the exclusive lock (re-locking
+        the same descriptor would downgrade, then drop it).
+        """
+        st = os.stat(self._log_path)
+        if st.st_ino == self._log_ino and st.st_size == self._log_offset:
+            return
+        if locked:
+            data = self._read_log()
+        else:
+            with self._file_lock(fcntl.LOCK_SH):
+                data = self._read_log()
+        # Only whole lines; a torn tail is picked up on the next call
+        data = data[:data.rfind(b"\n") + 1]
+        for line in data.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            if rec["op"] == "put":
+                self._apply_put(rec["id"], rec["payload"])
+            elif rec["op"] == "del":
+                self._apply_delete(rec["rows"])
+            elif rec["op"] == "gen":
+                self._vec_path = os.path.join(self.path, rec["vectors"])
+        self._log_offset += len(data)
+        if self._vecs is None or len(self._ids) > self._capacity:
+            self._remap()
+
+    def _read_log(self) -> bytes:
+        """Reads unapplied log bytes; the caller holds a file lock."""
+        with open(self._log_path, "rb") as fh:
+            ino = os.fstat(fh.fileno()).st_ino
+            if ino != self._log_ino:
+                self._reset(ino)
+            fh.seek(self._log_offset)
+            return fh.read()
+
+    def _remap(self):
+        """Maps the whole matrix file as it is on disk (never resizes it)."""
+        if self._vecs is not None:
+            self._vecs.flush()
+            self._vecs = None
+        self._capacity = os.path.getsize(self._vec_path) // (4 * self.dim) if os.path.exists(self._vec_path) else 0
+        if self._capacity == 0:
+            # New store: the first _grow() creates the file
+            return
+        self._vecs = np.memmap(self._vec_path, dtype=np.float32, mode="r+", shape=(self._capacity, self.dim))
+
+    def _grow(self, needed: int):
+        """Makes room for `needed` rows. Callers hold the exclusive file lock."""
+        on_disk = os.path.getsize(self._vec_path) // (4 * self.dim) if os.path.exists(self._vec_path) else 0
+        if needed > on_disk:
+            with open(self._vec_path, "ab") as fh:
+                fh.truncate(max(needed, on_disk * 2) * self.dim * 4)
+        if needed > self._capacity or self._vecs is None:
+            self._remap()
+
+    # --- in-memory index ---
+
+    def _apply_put(self, point_id: str, payload: Dict[str, Any]) -> int:
+        old = self._id_to_row.get(point_id)
+        if old is not None:
+            self._apply_delete([old])
+        row = len(self._ids)
+        self._alive_mask = None
+        self._ids.append(point_id)
+        self._payloads.append(payload)
+        self._alive.append(True)
+        self._id_to_row[point_id] = row
+        self._by_candidate.setdefault(payload.get("candidate_id", ""), []).append(row)
+        return row
+
+    def _apply_delete(self, rows: List[int]):
+        touched = set()
+        for row in rows:
+            if not self._alive[row]:
+                continue
+            self._alive[row] = False
+            self._alive_mask = None
+            if self._id_to_row.get(self._ids[row]) == row:
+                del self._id_to_row[self._ids[row]]
+            touched.add(self._payloads[row].get("candidate_id", ""))
+        for cid in touched:
+            live = [r for r in self._by_candidate.get(cid, []) if self._alive[r]]
+            if live:
+                self._by_candidate[cid] = live
+            else:
+                self._by_candidate.pop(cid, None)
+
+    def live_count(self) -> int:
+        return len(self._id_to_row)
+
+    # --- compaction ---
+
+    def _maybe_compact(self):
+        """Compacts once enough rows are tombstones. Callers hold the exclusive file lock."""
+        rows = len(self._ids)
+        if rows >= self.COMPACT_MIN_ROWS and (rows - self.live_count()) / rows > settings.VECTOR_COMPACT_RATIO:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        """Rewrites live rows into a new generation. Callers hold the exclusive file lock."""
+        live = [r for r in range(len(self._ids)) if self._alive[r]]
+        old_vec_path = self._vec_path
+        vec_name = f"vectors.{uuid.uuid4().hex[:12]}.f32"
+        vec_path = os.path.join(self.path, vec_name)
+        tmp_log = f"{self._log_path}.compact"
+
+        vecs = np.memmap(vec_path, dtype=np.float32, mode="w+", shape=(max(len(live), 1024), self.dim))
+        for i in range(0, len(live), 65536):
+            batch = live[i:i + 65536]
+            vecs[i:i + len(batch)] = self._vecs[batch]
+        vecs.flush()
+        del vecs
+
+        with open(tmp_log, "w", encoding="utf-8") as fh:
+            fh.write(json.dumps({"op": "gen", "vectors": vec_name}) + "\n")
+            for r in live:
+                fh.write(json.dumps({"op": "put", "id": self._ids[r], "payload": self._payloads[r]}) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        # Commit point: readers now see the new generation, the old matrix is unreferenced
+        os.replace(tmp_log, self._log_path)
+        before = len(self._ids)
+        self._vecs = None
+        self._tail(locked=True)
+        if old_vec_path != self._vec_path:
+            # Processes still mapping it keep their pages until they reload
+            os.remove(old_vec_path)
+        logger.info(f"🧹 Compacted vector store: {before} -> {len(self._ids)} rows")
+
+    def _compact_sync(self):
+        with self._lock:
+            self._open()
+            with self._file_lock(fcntl.LOCK_EX):
+                self._tail(locked=True)
+                self._compact_locked()
+
+    # --- sync operations (run via asyncio.to_thread) ---
+
+    def _upsert_sync(self, points: List[VectorPoint]):
+        with self._lock:
+            self._open()
+            with self._file_lock(fcntl.LOCK_EX):
+                # Rows are positions in the shared log: catch up before allocating
+                self._tail(locked=True)
+                self._grow(len(self._ids) + len(points))
+                lines = []
+                for p in points:
+                    # Replaying a put for a known id tombstones the old row too
+                    row = self._apply_put(p.id, p.payload)
+                    vec = np.asarray(p.vector, dtype=np.float32)
+                    self._vecs[row] = vec / (np.linalg.norm(vec) or 1.0)
+                    lines.append(json.dumps({"op": "put", "id": p.id, "payload": p.payload}))
+                # Vectors first, then the log: a row only exists once it's logged
+                self._vecs.flush()
+                self._append(lines)
+                # Re-ingesting a document replaces its rows
+                self._maybe_compact()
+
+    def _append(self, lines: List[str]):
+        self._log.write("\n".join(lines) + "\n")
+        self._log.flush()
+        self._log_offset = os.path.getsize(self._log_path)
+
+    def _count_sync(self, candidate_id: str, doc_hash: Optional[str]) -> int:
+        with self._lock:
+            self._open()
+            self._tail()
+            rows = self._by_candidate.get(candidate_id, [])
+            if doc_hash is None:
+                return len(rows)
+            return sum(1 for r in rows if self._payloads[r].get("doc_hash") == doc_hash)
+
+    def _delete_stale_sync(self, candidate_id: str, keep_hash: Optional[str], doc_key: Optional[str]):
+        with self._lock:
+            self._open()
+            with self._file_lock(fcntl.LOCK_EX):
+                self._tail(locked=True)
+                stale = [
+                    r for r in self._by_candidate.get(candidate_id, [])
+                    if (keep_hash is None or self._payloads[r].get("doc_hash") != keep_hash)
+                    and (doc_key is None or self._payloads[r].get("doc_key") == doc_key)
+                ]
+                if stale:
+                    self._apply_delete(stale)
+                    self._append([json.dumps({"op": "del", "rows": stale})])
+                    self._maybe_compact()
+
+    def _search_batch_sync(
+        self, vectors, limit: int, candidate_id: Optional[str], with_vectors: bool = False
+    ) -> List[List[VectorHit]]:
+        with self._lock:
+            self._open()
+            self._tail()
+            queries = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+            if candidate_id is not None:
+                rows = np.asarray(self._by_candidate.get(candidate_id, []), dtype=np.int64)
+                if rows.size == 0:
+                    return [[] for _ in queries]
+                scores = self._vecs[rows] @ queries.T
+            else:
+                n = len(self._ids)
+                if n == 0:
+                    return [[] for _ in queries]
+                rows = np.arange(n)
+                scores = np.asarray(self._vecs[:n] @ queries.T)
+                if self._alive_mask is None:
+                    self._alive_mask = np.asarray(self._alive, dtype=bool)
+                scores[~self._alive_mask] = -np.inf
+
+            # Vectorized top-k per query column: partial partition, then sort only the winners
+            k = min(limit, rows.size)
+            top = np.argpartition(-scores, k - 1, axis=0)[:k]
+            results = []
+            for q in range(queries.shape[0]):
+                col = scores[:, q]
+                order = top[:, q][np.argsort(-col[top[:, q]])]
+                results.append([
+                    VectorHit(
+                        id=self._ids[rows[i]],
+                        score=float(col[i]),
+                        payload=self._payloads[rows[i]],
+                        # Copy out of the memmap: rows may be remapped by a later grow
+                        vector=np.array(self._vecs[rows[i]]) if with_vectors else None,
+                    )
+                    for i in order
+                    if np.isfinite(col[i])
+                ])
+            return results
+
+    # --- async interface ---
+
+    async def ensure(self):
+        await asyncio.to_thread(self._lock_and_open)
+
+    def _lock_and_open(self):
+        with self._lock:
+            self._open()
+
+    async def upsert(self, points: List[VectorPoint]):
+        await asyncio.to_thread(self._upsert_sync, points)
+
+    async def count(self, candidate_id: str, doc_hash: Optional[str] = None) -> int:
+        return await asyncio.to_thread(self._count_sync, candidate_id, doc_hash)
+
+    async def delete_stale(self, candidate_id: str, keep_hash: Optional[str], doc_key: Optional[str] = None):
+        await asyncio.to_thread(self._delete_stale_sync, candidate_id, keep_hash, doc_key)
+
+    async def compact(self):
+        """Drops tombstoned rows from disk now (normally triggered by VECTOR_COMPACT_RATIO)."""
+        await asyncio.to_thread(self._compact_sync)
+
+    async def search(
+        self, vector, limit: int, candidate_id: Optional[str] = None, with_vectors: bool = False
+    ) -> List[VectorHit]:
+        return (await self.search_batch([vector], limit, candidate_id, with_vectors))[0]
+
+    async def search_batch(
+        self, vectors, limit: int, candidate_id: Optional[str] = None, with_vectors: bool = False
+    ) -> List[List[VectorHit]]:
+        return await asyncio.to_thread(self._search_batch_sync, vectors, limit, candidate_id, with_vectors)
+
+    def stats(self) -> Dict[str, Any]:
+        if not self._opened:
+            return {"backend": self.name, "path": self.path}
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "live_points": self.live_count(),
+            "rows": len(self._ids),
+            "candidates": len(self._by_candidate),
+        }
+
+    async def close(self):
+        with self._lock:
+            if self._opened:
+                self._vecs.flush()
+                self._log.close()
+                self._lock_file.close()
+                self._opened = False
+
+
+def create_vector_store() -> VectorStore:
+    if settings.VECTOR_BACKEND == "numpy":
+        return NumpyVectorStore()
+    return QdrantVectorStore()
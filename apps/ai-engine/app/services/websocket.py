@@ -2,18 +2,51 @@ import asyncio
 import json
 import logging
 import base64
+import re
+import time
 import websockets
-from typing import Dict, Any
+from typing import Awaitable, Callable, Dict, Any, List, Tuple
 from fastapi import WebSocket, WebSocketDisconnect
 from starlette.websockets import WebSocketState
 
 from app.core.config import get_settings
 from app.models import SESSION_STORE
 from app.services.gateway import gateway  # The Router we built in Step 5
+from app.services.memory import memory
+from app.services.speculation import Speculator, speculation_stats
 
 logger = logging.getLogger("fortitwin.websocket")
 settings = get_settings()
 
+# Sentence boundary: terminal punctuation followed by whitespace
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def pop_sentences(buffer: str, min_chars: int) -> Tuple[List[str], str]:
+    """
+    Splits complete sentences off the front of a streamed buffer.
+    Sentences shorter than min_chars are merged into the next one so Hume
+    isn't handed fragments like "Great." on their own.
+    Returns (ready pieces, unfinished remainder).
+    """
+    parts = SENTENCE_END.split(buffer)
+    rest = parts.pop()  # Last part has no boundary after it yet
+    ready: List[str] = []
+    pending = ""
+    for part in parts:
+        pending = f"{pending} {part}" if pending else part
+        if len(pending) >= min_chars:
+            ready.append(pending)
+            pending = ""
+    if pending:
+        rest = f"{pending} {rest}" if rest else pending
+    return ready, rest
+
+
+def partial_text(event: Dict[str, Any]) -> str:
+    """Transcript text of a user_partial / transcription_partial event."""
+    return event.get("partial") or event.get("message", {}).get("content") or event.get("text") or ""
+
 class WebSocketManager:
     """
     Manages real-time voice & text connections for multiple students.
@@ -131,8 +164,30 @@ class WebSocketManager:
         except WebSocketDisconnect:
             pass
 
+    def _turn_kwargs(self, session_id: str, sess: dict, user_text: str, record: bool = True) -> dict:
+        return dict(
+            job_title=sess.get("job_title", "Engineer"),
+            company=sess.get("company", "Tech Corp"),
+            # Bounded memory: running summary + last few turns + this answer
+            history=memory.history(session_id, sess, user_text, record=record),
+            context=sess.get("rag_context", "")
+        )
+
+    async def _generate_text(self, kwargs: dict) -> str:
+        """Full reply text without speaking it (used for speculation)."""
+        if settings.VOICE_STREAMING:
+            return "".join([delta async for delta in gateway.stream_response(**kwargs)])
+        return (await gateway.generate_response(call_type="voice_turn", **kwargs)).response_text
+
     async def _forward_hume_to_frontend(self, ws_client: WebSocket, ws_hume, session_id: str, sess: dict):
         """Reads Hume audio/text -> sends to student + Calls LLM Gateway"""
+        # Speculative replies: start generating on a stable partial transcript,
+        # reuse the result if the final transcript matches it closely enough.
+        speculator = None
+        if settings.VOICE_SPECULATION:
+            speculator = Speculator(
+                lambda text: self._generate_text(self._turn_kwargs(session_id, sess, text, record=False))
+            )
         try:
             while True:
                 data = await ws_hume.recv()
@@ -158,44 +213,123 @@ class WebSocketManager:
                     user_text = event.get("message", {}).get("content", "")
                     if user_text:
                         logger.info(f"🗣️ User said: {user_text}")
-                        
-                        # Save to DB
-                        await SESSION_STORE.add_transcript(session_id, "candidate", user_text)
+                        turn_start = time.perf_counter()
+                        outcome = "none"
+                        first_speech = []
+
+                        async def speak(text: str):
+                            # End-of-speech -> first audio request, per speculation outcome
+                            if not first_speech:
+                                first_speech.append(True)
+                                speculation_stats.record_reply(outcome, time.perf_counter() - turn_start)
+                            await ws_hume.send(json.dumps({"type": "assistant_input", "text": text}))
+
+                        # Save to DB (concurrently with resolving the speculation)
+                        save = asyncio.create_task(SESSION_STORE.add_transcript(session_id, "candidate", user_text))
 
                         # --- CALL THE NEW GATEWAY (ROUTER) ---
                         # This replaces the old blocking ENGINE.next_question
-                        ai_response = await gateway.generate_response(
-                            job_title=sess.get("job_title", "Engineer"),
-                            company=sess.get("company", "Tech Corp"),
-                            history=[{"role": "user", "content": user_text}], # Simplified history
-                            context=sess.get("rag_context", "")
-                        )
+                        next_q = None
+                        if speculator is not None:
+                            speculated = speculator.active
+                            next_q = await speculator.resolve(user_text)  # Also drops a pending timer
+                            if speculated:
+                                outcome = "hit" if next_q is not None else "miss"
 
-                        next_q = ai_response.response_text
-                        logger.info(f"🤖 AI replied: {next_q}")
+                        if next_q is not None:
+                            await self._speak_text(ws_client, speak, next_q)
+                        else:
+                            kwargs = self._turn_kwargs(session_id, sess, user_text)
+                            if settings.VOICE_STREAMING:
+                                next_q = await self._stream_reply(ws_client, speak, kwargs)
+                            else:
+                                next_q = await self._send_reply(ws_client, speak, kwargs)
+                        logger.info(f"🤖 AI replied ({outcome} speculation): {next_q}")
 
-                        # Save AI Reply
+                        # Save AI Reply (after the candidate's line, to keep transcript order)
+                        await save
                         await SESSION_STORE.add_transcript(session_id, "interviewer", next_q)
 
-                        # A. Tell Hume to speak it
-                        await ws_hume.send(json.dumps({
-                            "type": "assistant_input",
-                            "text": next_q
-                        }))
-
-                        # B. Tell Frontend to show it
-                        await ws_client.send_text(json.dumps({
-                            "type": "assistant_message",
-                            "message": {"content": next_q}
-                        }))
+                        # Keep the local session copy current, then update the summary off the hot path
+                        transcript = sess.setdefault("transcript", [])
+                        transcript.append({"role": "candidate", "text": user_text})
+                        transcript.append({"role": "interviewer", "text": next_q})
+                        memory.schedule_update(session_id, list(transcript))
                 
                 # 3. Forward Partial Transcripts (Real-time captions)
                 elif evt_type in ["transcription_partial", "user_partial"]:
                     # Forward raw event so UI updates live
                     await ws_client.send_text(json.dumps(event))
+                    if speculator is not None:
+                        speculator.on_partial(partial_text(event))
 
         except Exception as e:
             logger.error(f"Error in Hume->Frontend loop: {e}")
+        finally:
+            if speculator is not None:
+                speculator.close()
+
+    async def _speak_text(self, ws_client: WebSocket, speak: Callable[[str], Awaitable[None]], text: str):
+        """Speaks an already generated reply sentence by sentence, then captions it."""
+        ready, rest = pop_sentences(text, settings.VOICE_MIN_CHUNK_CHARS)
+        for sentence in ready + ([rest.strip()] if rest.strip() else []):
+            await speak(sentence)
+        await ws_client.send_text(json.dumps({
+            "type": "assistant_message",
+            "message": {"content": text}
+        }))
+
+    async def _send_reply(self, ws_client: WebSocket, speak: Callable[[str], Awaitable[None]], kwargs: dict) -> str:
+        """Whole-turn reply: waits for the full structured response."""
+        ai_response = await gateway.generate_response(call_type="voice_turn", **kwargs)
+        next_q = ai_response.response_text
+
+        # A. Tell Hume to speak it
+        await speak(next_q)
+
+        # B. Tell Frontend to show it
+        await ws_client.send_text(json.dumps({
+            "type": "assistant_message",
+            "message": {"content": next_q}
+        }))
+        return next_q
+
+    async def _stream_reply(self, ws_client: WebSocket, speak: Callable[[str], Awaitable[None]], kwargs: dict) -> str:
+        """
+        Streamed reply: each complete sentence goes to Hume as soon as it
+        exists, and the frontend caption grows with every delta.
+        """
+        spoken = ""
+        buffer = ""
+        async for delta in gateway.stream_response(**kwargs):
+            spoken += delta
+            buffer += delta
+
+            # A. Tell Hume to speak finished sentences
+            ready, buffer = pop_sentences(buffer, settings.VOICE_MIN_CHUNK_CHARS)
+            for sentence in ready:
+                await speak(sentence)
+
+            # B. Live caption (cumulative, so the UI just replaces its text)
+            await ws_client.send_text(json.dumps({
+                "type": "assistant_message",
+                "message": {"content": spoken},
+                "partial": True
+            }))
+
+        if buffer.strip():
+            await speak(buffer.strip())
+        await ws_client.send_text(json.dumps({
+            "type": "assistant_message",
+            "message": {"content": spoken}
+        }))
+        return spoken
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_connections": len(self.active_connections),
+            "speculation": speculation_stats.stats(),
+        }
 
 # Singleton
 ws_manager = WebSocketManager()
\ No newline at end of file
@@ -1,22 +1,85 @@
 import logging
+
+import httpx
+from arq import func
 from arq.connections import RedisSettings
+from groq import AsyncGroq
+
 from app.core.config import get_settings
-from app.workers.tasks import parse_and_ingest_resume
+from app.models import client as mongo_client
+from app.services.context import load_tokenizer
+from app.services.gateway import gateway
+from app.services.rag_service import rag
+from app.workers.pdf import PdfPool
+from app.workers.tasks import parse_and_ingest_resume, score_interview
 
 settings = get_settings()
+logger = logging.getLogger("fortitwin.worker")
 
 # Configure logging for the worker process
 logging.basicConfig(level=logging.INFO)
 
 async def startup(ctx):
+    """
+    Builds the shared resource context once per worker process.
+    Jobs pull clients from ctx instead of constructing their own, so job
+    latency never includes TLS handshakes or model loading.
+    """
+    # 1. PDF parsing is CPU-bound: give it real cores instead of the event loop.
+    ctx["pdf_pool"] = PdfPool(settings.WORKER_PDF_PROCESSES)
+
+    # 2. One pooled HTTP client (keep-alive) shared by the LLM SDKs,
+    # including the gateway's providers that scoring jobs call through
+    ctx["http"] = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.WORKER_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.WORKER_HTTP_MAX_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(30.0, connect=5.0),
+    )
+    gateway.use_http_client(ctx["http"])
+    ctx["groq"] = None
+    if settings.GROQ_API_KEY:
+        ctx["groq"] = AsyncGroq(api_key=settings.GROQ_API_KEY, http_client=ctx["http"])
+
+    # 3. Embedding model + vector store
+    ctx["rag"] = rag
+
+    # 4. Warm everything with a dummy call so the first job pays nothing extra
+    await rag.warmup()
+    await load_tokenizer()
+    for name, warm in [
+        ("groq", ctx["groq"] and ctx["groq"].models.list()),
+        ("openai", gateway.openai_client and gateway.openai_client.models.list()),
+        ("mongo", mongo_client.admin.command("ping")),
+    ]:
+        if not warm:
+            continue
+        try:
+            await warm
+            logger.info(f"🔥 Warmed {name}")
+        except Exception as e:
+            logger.warning(f"⚠️ Warmup failed for {name}: {e}")
+
     print("💪 Background Worker Started")
 
 async def shutdown(ctx):
+    ctx["pdf_pool"].shutdown()
+    await ctx["http"].aclose()
+    await ctx["rag"].close()
+    await gateway.close()
+    mongo_client.close()
     print("💤 Background Worker Stopping")
 
 class WorkerSettings:
     # Connect to Redis (localhost:6379 by default)
-    functions = [parse_and_ingest_resume]
+    functions = [
+        parse_and_ingest_resume,
+        # Long interviews are scored in many segments at background priority
+        func(score_interview, timeout=settings.WORKER_SCORING_TIMEOUT),
+    ]
     redis_settings = RedisSettings.from_dsn(settings.REDIS_URL)
     on_startup = startup
-    on_shutdown = shutdown
\ No newline at end of file
+    on_shutdown = shutdown
+    max_jobs = settings.WORKER_MAX_JOBS
+    job_timeout = settings.WORKER_JOB_TIMEOUT
@@ -0,0 +1,116 @@
+"""
+PDF text extraction that runs inside the worker's process pool.
+
+Functions at module level are what the pool executes, so this module must
+stay import-light (no settings, no models): spawned children import it cold.
+"""
+import asyncio
+import logging
+import mmap
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import pypdf
+
+logger = logging.getLogger("fortitwin.worker.pdf")
+
+
+def new_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Pool for extract_pages. "spawn" keeps children clean of the parent's
+    ONNX threads and sockets.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+class PdfPool:
+    """
+    The worker's extraction pool. Held in ctx as one object because ARQ
+    gives every job a shallow copy of ctx: replacing ctx["pdf_pool"] inside
+    a job would not reach later jobs, swapping self.executor does.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers
+        self.executor = new_pool(max_workers)
+
+    def recycle(self):
+        """Swaps in a fresh pool; the old one winds down once its running tasks return."""
+        old, self.executor = self.executor, new_pool(self.max_workers)
+        old.shutdown(wait=False)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def extract_pages(path: str, start: int, stop: int) -> Tuple[int, List[str]]:
+    """Extracts text for pages [start, stop). Returns (total_pages, texts)."""
+    # Memory-map the file: page-range tasks share the OS page cache instead of copies
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        reader = pypdf.PdfReader(mm)
+        total = len(reader.pages)
+        texts = []
+        for page in reader.pages[start:min(stop, total)]:
+            # Extract once per page; empty pages are dropped
+            if text := page.extract_text():
+                texts.append(text)
+    return total, texts
+
+
+async def extract_text(
+    pool: Executor,
+    path: str,
+    max_pages: int = 20,
+    pages_per_task: int = 4,
+    timeout: float = 30.0,
+) -> Tuple[str, bool]:
+    """
+    Extracts text on the process pool, fanning large PDFs out per page range.
+    Pages beyond max_pages are ignored. If the time budget runs out, the text
+    of the leading ranges that did finish is returned (possibly empty) and
+    the second value, complete, is False.
+
+    Only ranges still queued are cancelled on timeout: a range already
+    running cannot be interrupted and keeps its pool process busy until it
+    ends. Callers should recycle the pool when complete is False (see
+    PdfPool) so later jobs are not starved by it.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    # 1. First range also tells us the page count
+    first = loop.run_in_executor(pool, extract_pages, path, 0, pages_per_task)
+    done, _ = await asyncio.wait([first], timeout=timeout)
+    if not done:
+        first.cancel()
+        logger.warning("⏱️ PDF extraction budget hit before the first page range finished")
+        return "", False
+    total, head = first.result()
+    last = min(total, max_pages)
+    if total > max_pages:
+        logger.info(f"📄 PDF has {total} pages, extracting first {max_pages}")
+
+    # 2. Remaining ranges in parallel
+    futures = [
+        loop.run_in_executor(pool, extract_pages, path, start, min(start + pages_per_task, last))
+        for start in range(pages_per_task, last, pages_per_task)
+    ]
+    pending = set()
+    if futures:
+        done, pending = await asyncio.wait(futures, timeout=max(0.0, deadline - loop.time()))
+        for fut in pending:
+            fut.cancel()
+        if pending:
+            logger.warning(f"⏱️ PDF extraction budget hit, {len(pending)} page ranges dropped")
+
+    # 3. Keep document order, stopping at the first range that didn't finish
+    texts = list(head)
+    for fut in futures:
+        if not fut.done() or fut.cancelled() or fut.exception():
+            break
+        texts.extend(fut.result()[1])
+    return "\n".join(texts), not pending
@@ -1,55 +1,141 @@
 import logging
-import io
 import json
-import pypdf
-from groq import AsyncGroq
+from pydantic import ValidationError
 from app.core.config import get_settings
-from app.services.rag_service import rag
+from app.models import CandidateProfile, PROFILE_STORE, SCORE_STORE, SESSION_STORE, transcript_hash
+from app.services.blob_store import blob_store
+from app.services.gateway import gateway
+from app.services.rate_limit import BACKGROUND
+from app.services.routing import LARGE_GROQ
+from app.workers.pdf import extract_text
 
 settings = get_settings()
 logger = logging.getLogger("fortitwin.worker")
 
-async def parse_and_ingest_resume(ctx, file_content: bytes, filename: str, candidate_id: str):
+async def parse_and_ingest_resume(ctx, blob_digest: str, filename: str, candidate_id: str):
     """
     Background Task:
-    1. Extracts text from PDF
+    1. Extracts text from PDF (this job's link in the shared blob store)
     2. Ingests into Qdrant (RAG)
-    3. (Optional) pre-calculates summary using Groq
+    3. (Optional) pre-calculates a candidate profile using Groq and stores it in MongoDB
     """
     logger.info(f"🔨 [Worker] Starting job for: {filename}")
+    rag = ctx["rag"]
 
     try:
-        # 1. CPU Intensive: PDF Extraction
-        pdf_file = io.BytesIO(file_content)
-        reader = pypdf.PdfReader(pdf_file)
-        text = "\n".join([page.extract_text() for page in reader.pages if page.extract_text()])
-        
+        # 0. Idempotency: the same PDF re-uploaded is a no-op once it is both
+        # indexed and profiled. The blob digest is the sha256 of the file, i.e.
+        # the document hash. An earlier run that indexed it but failed before
+        # the profile only redoes the profile.
+        doc_hash = blob_digest
+        indexed = await rag.has_document(candidate_id, doc_hash)
+        profiled = not ctx["groq"]
+        if not profiled:
+            existing = await PROFILE_STORE.get(candidate_id)
+            profiled = existing is not None and existing.get("doc_hash") == doc_hash
+        if indexed and profiled:
+            logger.info(f"♻️ [Worker] {filename} already ingested for {candidate_id}, skipping")
+            return {"status": "duplicate", "doc_hash": doc_hash}
+
+        # A profile built from an older resume must not outlive it:
+        # until the new one is written, interviews fall back to RAG.
+        await PROFILE_STORE.invalidate(candidate_id, keep_hash=doc_hash)
+
+        # 1. CPU Intensive: PDF Extraction (process pool, per-page-range parallel)
+        text, complete = await extract_text(
+            ctx["pdf_pool"].executor,
+            blob_store.job_path(ctx["job_id"]),
+            max_pages=settings.PDF_MAX_PAGES,
+            pages_per_task=settings.PDF_PAGES_PER_TASK,
+            timeout=settings.PDF_EXTRACT_TIMEOUT,
+        )
+        if not complete:
+            # Timed-out ranges can't be interrupted: hand new jobs a fresh pool
+            # and let the old one wind down once its stuck processes return.
+            ctx["pdf_pool"].recycle()
+        if not text:
+            logger.warning(f"⚠️ [Worker] No text extracted from {filename} for {candidate_id}")
+
         # Safety truncate
         text = text[:15000]
 
         # 2. RAG Ingestion (The Memory)
-        await rag.ingest_document(
-            text=text,
-            metadata={"candidate_id": candidate_id, "filename": filename}
-        )
-        logger.info(f"✅ [Worker] Ingestion complete for {candidate_id}")
+        if indexed:
+            ingest_stats = {"status": "already_indexed"}
+        else:
+            ingest_stats = await rag.ingest_document(
+                text=text,
+                metadata={"candidate_id": candidate_id, "filename": filename},
+                doc_hash=doc_hash,
+            )
+            if "error" in ingest_stats:
+                # ingest_document reports instead of raising: fail the job here
+                raise RuntimeError(f"Ingestion failed: {ingest_stats['error']}")
+        logger.info(f"✅ [Worker] Ingestion complete for {candidate_id}: {ingest_stats}")
 
-        # 3. (Optional) Generate a quick summary to store in DB
-        # You could write this to MongoDB here if you wanted persistent profile data
-        if settings.GROQ_API_KEY:
-            client = AsyncGroq(api_key=settings.GROQ_API_KEY)
-            chat = await client.chat.completions.create(
+        # 3. (Optional) Generate a candidate profile and persist it
+        # /interview/start uses it as ready-made context instead of a live RAG search.
+        if ctx["groq"] and text:
+            # Same shared quota as the API; queues behind live interview turns
+            await gateway.limits.acquire("groq", LARGE_GROQ, BACKGROUND)
+            chat = await ctx["groq"].chat.completions.create(
                 messages=[
-                    {"role": "system", "content": "Extract JSON: skills(list), seniority"},
+                    {
+                        "role": "system",
+                        "content": "Extract JSON: skills(list), seniority, recent_role, highlights(list of max 3 short strings)",
+                    },
                     {"role": "user", "content": text[:3000]}
                 ],
-                model="llama-3.3-70b-versatile",
+                model=LARGE_GROQ,
                 response_format={"type": "json_object"}
             )
             summary = json.loads(chat.choices[0].message.content)
             logger.info(f"🧠 [Worker] Analysis: {summary}")
-            return summary
+            try:
+                profile = CandidateProfile(**summary)
+            except ValidationError as e:
+                logger.warning(f"⚠️ [Worker] Profile rejected, interviews will use RAG: {e}")
+                return {"ingest": ingest_stats, "summary": summary}
+            await PROFILE_STORE.save(candidate_id, doc_hash, profile)
+            return {"ingest": ingest_stats, "summary": summary}
+
+        return {"ingest": ingest_stats}
 
     except Exception as e:
         logger.error(f"❌ [Worker] Job failed: {e}")
-        return {"error": str(e)}
\ No newline at end of file
+        # Re-raise so ARQ records a failed job (not a successful {"error": ...} result)
+        raise
+    finally:
+        # Drop this job's link; the content stays while other jobs link it.
+        # A retry re-uploads the file.
+        blob_store.release(blob_digest, ctx["job_id"])
+
+
+async def score_interview(ctx, session_id: str, t_hash: str):
+    """
+    Background Task: scores an interview transcript and persists the result.
+    Keyed by (session, transcript hash), so a repeat of the same job is a
+    Mongo read instead of another scoring call.
+    """
+    logger.info(f"🔨 [Worker] Scoring session {session_id}")
+
+    cached = await SCORE_STORE.get(session_id, t_hash)
+    if cached:
+        return {"status": "complete", "transcript_hash": t_hash, "scores": cached["scores"]}
+
+    sess = await SESSION_STORE.get_session(session_id)
+    transcript = sess.get("transcript", [])
+    # The transcript may have grown since the job was queued; score what is
+    # there now, under its own hash.
+    t_hash = transcript_hash(transcript)
+
+    # Failures raise (no placeholder score is persisted); ARQ records the error.
+    evaluation = await gateway.evaluate_interview(
+        transcript=transcript,
+        job_title=sess["job_title"],
+        fallback=False,
+    )
+    scores = evaluation.dict()
+    await SCORE_STORE.save(session_id, t_hash, scores)
+    logger.info(f"✅ [Worker] Scored session {session_id}")
+    return {"status": "complete", "transcript_hash": t_hash, "scores": scores}
@@ -0,0 +1,78 @@
+"""
+Embedding throughput with and without the cross-job micro-batcher.
+
+Each simulated ingest embeds a resume-sized set of unique chunks (the chunk
+cache is not involved). Reports chunks/s for 1/8/32 concurrent ingests.
+
+--stub-call-ms replaces the model with a sleep of that many ms per model
+call (plus --stub-text-ms per text), which isolates the batching effect
+from the hardware and needs no model download. Results: benchmarks/README.md.
+
+    python -m benchmarks.embedding_batcher --ingests 1 8 32 --chunks 40
+    python -m benchmarks.embedding_batcher --stub-call-ms 20 --stub-text-ms 0.5
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.services.embeddings import LocalEmbedder
+from app.services.vector_store import EMBEDDING_DIM
+
+
+class StubEmbedder(LocalEmbedder):
+    """LocalEmbedder whose model call is a fixed-cost sleep (releases the GIL like ONNX)."""
+
+    def __init__(self, call_ms: float, text_ms: float):
+        self.call_ms = call_ms
+        self.text_ms = text_ms
+        super().__init__()
+
+    def _embed_sync(self, texts):
+        time.sleep((self.call_ms + self.text_ms * len(texts)) / 1000)
+        return [np.zeros(EMBEDDING_DIM, dtype=np.float32) for _ in texts]
+
+
+def resume_chunks(ingest: int, n: int):
+    return [
+        f"Candidate {ingest}: built service {i} in Python and SQL, improved latency by {i % 50}%"
+        for i in range(n)
+    ]
+
+
+async def run(embedder: LocalEmbedder, ingests: int, chunks: int) -> float:
+    t0 = time.perf_counter()
+    await asyncio.gather(*(embedder.embed(resume_chunks(i, chunks)) for i in range(ingests)))
+    return ingests * chunks / (time.perf_counter() - t0)
+
+
+async def main(ingest_counts, chunks, stub_call_ms=None, stub_text_ms=0.0):
+    if stub_call_ms is None:
+        embedder = LocalEmbedder()
+    else:
+        embedder = StubEmbedder(stub_call_ms, stub_text_ms)
+    await embedder.embed(["warmup"])
+    batcher = embedder.batcher
+
+    print(f"{'ingests':>8}{'unbatched/s':>14}{'batched/s':>12}{'speedup':>9}")
+    for n in ingest_counts:
+        embedder.batcher = None
+        plain = await run(embedder, n, chunks)
+        embedder.batcher = batcher
+        batched = await run(embedder, n, chunks) if batcher else plain
+        print(f"{n:>8}{plain:>14.0f}{batched:>12.0f}{batched / plain:>8.2f}x")
+
+    if batcher:
+        print("batcher:", batcher.stats())
+    await embedder.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ingests", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--stub-call-ms", type=float, default=None)
+    parser.add_argument("--stub-text-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.ingests, args.chunks, args.stub_call_ms, args.stub_text_ms))
@@ -0,0 +1,73 @@
+"""
+Filtered search latency and Qdrant memory for fortitwin_knowledge layouts.
+
+For each candidate count, loads CHUNKS_PER_CANDIDATE random vectors per
+candidate into three collection layouts and times candidate-filtered
+top-3 searches:
+
+  baseline   no payload index, float32 vectors in RAM (previous bootstrap)
+  indexed    keyword payload indexes on candidate_id/filename/doc_hash/doc_key
+  int8+disk  indexes + int8 scalar quantization (rescored) + on-disk originals
+
+Memory is the growth of the server's allocated bytes (from /metrics) while
+a layout is loaded, so run against an otherwise idle Qdrant.
+
+    python -m benchmarks.qdrant_filtered_search --qdrant-url http://localhost:6333 --candidates 1000 10000 50000
+"""
+import argparse
+import asyncio
+import re
+
+import httpx
+import numpy as np
+
+from app.services.vector_store import QdrantVectorStore
+from benchmarks.vector_store import CHUNKS_PER_CANDIDATE, batches, time_searches
+
+
+class UnindexedQdrantVectorStore(QdrantVectorStore):
+    INDEXED_FIELDS = ()
+
+
+LAYOUTS = {
+    "baseline": lambda url, name: UnindexedQdrantVectorStore(url, name, quantization=False, on_disk=False),
+    "indexed": lambda url, name: QdrantVectorStore(url, name, quantization=False, on_disk=False),
+    "int8+disk": lambda url, name: QdrantVectorStore(url, name, quantization=True, on_disk=True),
+}
+
+
+async def allocated_bytes(url: str) -> float:
+    async with httpx.AsyncClient() as client:
+        text = (await client.get(f"{url}/metrics")).text
+    match = re.search(r"^memory_allocated_bytes\s+([0-9.e+]+)", text, re.M)
+    return float(match.group(1)) if match else float("nan")
+
+
+async def main(url: str, candidate_counts, queries: int):
+    print(f"{'layout':<11}{'candidates':>11}{'chunks':>10}{'p50 ms':>9}{'p95 ms':>9}{'mem MiB':>9}")
+    for candidates in candidate_counts:
+        n = candidates * CHUNKS_PER_CANDIDATE
+        for layout, factory in LAYOUTS.items():
+            store = factory(url, f"bench_{layout.replace('+', '_')}_{candidates}")
+            await store.client.delete_collection(store.collection_name)
+            before = await allocated_bytes(url)
+
+            rng = np.random.default_rng(0)
+            for points in batches(n, rng):
+                await store.upsert(points)
+            mem = (await allocated_bytes(url) - before) / 2**20
+
+            p50, p95 = await time_searches(store, n, queries, rng)
+            print(f"{layout:<11}{candidates:>11}{n:>10}{p50:>9.2f}{p95:>9.2f}{mem:>9.1f}")
+
+            await store.client.delete_collection(store.collection_name)
+            await store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--qdrant-url", type=str, default="http://localhost:6333")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.qdrant_url, args.candidates, args.queries))
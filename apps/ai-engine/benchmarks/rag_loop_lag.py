@@ -0,0 +1,88 @@
+"""
+Event-loop lag under concurrent interview starts.
+
+Compares the old inline embedding path (model called directly on the loop)
+with the executor-backed LocalEmbedder used by RAGService. A heartbeat task ticks every 5ms;
+any extra delay it observes is time the loop could not serve other sessions.
+
+--stub-ms swaps the model for one that sleeps that long per embed call
+(GIL released, like ONNX), for runs without the model download.
+Results: benchmarks/README.md.
+
+    python -m benchmarks.rag_loop_lag --starts 1 8 32
+    python -m benchmarks.rag_loop_lag --stub-ms 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+
+from app.services.embeddings import LocalEmbedder
+from app.services.vector_store import EMBEDDING_DIM
+
+TICK = 0.005
+
+
+class StubModel:
+    """Stands in for TextEmbedding: a fixed-cost blocking call per embed()."""
+
+    def __init__(self, ms: float):
+        self.ms = ms
+
+    def embed(self, texts, batch_size=None):
+        time.sleep(self.ms / 1000)
+        return (np.zeros(EMBEDDING_DIM, dtype=np.float32) for _ in texts)
+
+
+async def heartbeat(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(max(0.0, time.perf_counter() - t0 - TICK))
+
+
+async def run(embedder: LocalEmbedder, starts: int, inline: bool):
+    lags, stop = [], asyncio.Event()
+    hb = asyncio.create_task(heartbeat(lags, stop))
+    await asyncio.sleep(TICK * 2)
+
+    async def one_start(i: int):
+        query = f"Backend Engineer {i} experience skills"
+        if inline:
+            list(embedder.model.embed([query]))
+        else:
+            await embedder.embed([query])
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one_start(i) for i in range(starts)))
+    wall = time.perf_counter() - t0
+    stop.set()
+    await hb
+
+    lags_ms = sorted(l * 1000 for l in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    return wall * 1000, statistics.mean(lags_ms), p99, lags_ms[-1]
+
+
+async def main(start_counts, stub_ms=None):
+    embedder = LocalEmbedder()
+    if stub_ms is not None:
+        embedder._model = StubModel(stub_ms)
+    await embedder.embed(["warmup"])
+    print(f"{'mode':<10}{'starts':>8}{'wall ms':>10}{'lag avg':>10}{'lag p99':>10}{'lag max':>10}")
+    for n in start_counts:
+        for inline in (True, False):
+            wall, avg, p99, mx = await run(embedder, n, inline)
+            mode = "before" if inline else "after"
+            print(f"{mode:<10}{n:>8}{wall:>10.1f}{avg:>10.2f}{p99:>10.2f}{mx:>10.2f}")
+    await embedder.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--starts", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--stub-ms", type=float, default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.starts, args.stub_ms))
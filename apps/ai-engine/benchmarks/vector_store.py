@@ -0,0 +1,107 @@
+"""
+Per-candidate search latency: embedded numpy backend vs Qdrant.
+
+Loads N random unit vectors spread over candidates (CHUNKS_PER_CANDIDATE
+each) into both backends, then times filtered top-3 searches for random
+candidates through the async VectorStore interface RAGService uses.
+Qdrant is skipped unless --qdrant-url is given; --qdrant-local uses
+qdrant-client's in-process mode instead (brute force in Python, so only a
+stand-in when no server is available). Results: benchmarks/README.md.
+
+    python -m benchmarks.vector_store --sizes 1000 100000 1000000 --qdrant-url http://localhost:6333
+"""
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+
+from app.services.vector_store import (
+    EMBEDDING_DIM,
+    NumpyVectorStore,
+    QdrantVectorStore,
+    VectorPoint,
+)
+
+CHUNKS_PER_CANDIDATE = 30
+BATCH = 5000
+
+
+def batches(n: int, rng: np.random.Generator):
+    for start in range(0, n, BATCH):
+        size = min(BATCH, n - start)
+        vecs = rng.normal(size=(size, EMBEDDING_DIM)).astype(np.float32)
+        yield [
+            VectorPoint(
+                id=f"00000000-0000-0000-0000-{start + i:012d}",
+                vector=vecs[i],
+                payload={
+                    "candidate_id": f"cand-{(start + i) // CHUNKS_PER_CANDIDATE}",
+                    "doc_hash": "bench",
+                    "text": f"chunk {start + i}",
+                },
+            )
+            for i in range(size)
+        ]
+
+
+async def time_searches(store, n: int, queries: int, rng: np.random.Generator):
+    candidates = max(1, n // CHUNKS_PER_CANDIDATE)
+    latencies = []
+    for _ in range(queries):
+        q = rng.normal(size=EMBEDDING_DIM).astype(np.float32)
+        cid = f"cand-{rng.integers(candidates)}"
+        t0 = time.perf_counter()
+        await store.search(q, limit=3, candidate_id=cid)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+async def bench(store, n: int, queries: int):
+    rng = np.random.default_rng(0)
+    t0 = time.perf_counter()
+    for points in batches(n, rng):
+        await store.upsert(points)
+    load = time.perf_counter() - t0
+    p50, p95 = await time_searches(store, n, queries, rng)
+    return load, p50, p95
+
+
+async def main(sizes, queries, qdrant_url, qdrant_local=False):
+    print(f"{'backend':<8}{'chunks':>10}{'load s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for n in sizes:
+        tmp = tempfile.mkdtemp(prefix="fortitwin-vs-")
+        store = NumpyVectorStore(tmp)
+        load, p50, p95 = await bench(store, n, queries)
+        print(f"{'numpy':<8}{n:>10}{load:>9.1f}{p50:>9.3f}{p95:>9.3f}")
+        await store.close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+        if qdrant_url:
+            store = QdrantVectorStore(url=qdrant_url, collection_name=f"bench_{n}")
+            await store.client.delete_collection(store.collection_name)
+            load, p50, p95 = await bench(store, n, queries)
+            print(f"{'qdrant':<8}{n:>10}{load:>9.1f}{p50:>9.3f}{p95:>9.3f}")
+            await store.client.delete_collection(store.collection_name)
+            await store.close()
+
+        if qdrant_local:
+            store = QdrantVectorStore(url="http://unused", collection_name=f"bench_{n}")
+            store.client = AsyncQdrantClient(location=":memory:")
+            load, p50, p95 = await bench(store, n, queries)
+            print(f"{'q-local':<8}{n:>10}{load:>9.1f}{p50:>9.3f}{p95:>9.3f}")
+            await store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--qdrant-url", type=str, default=None)
+    parser.add_argument("--qdrant-local", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.queries, args.qdrant_url, args.qdrant_local))
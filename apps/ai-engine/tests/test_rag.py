@@ -0,0 +1,69 @@
+"""
+app.rag.retrieve() is the sync entry point the CLI uses. Repeated calls in
+one process must reuse the rag singleton's loop-bound state, not hang.
+Runs offline: embedded numpy vector store and a stub embedding model.
+
+    python -m pytest tests
+"""
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+_tmp = tempfile.mkdtemp(prefix="fortitwin-test-")
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017/fortitwin_test")
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ["VECTOR_BACKEND"] = "numpy"
+os.environ["VECTOR_STORE_DIR"] = os.path.join(_tmp, "vectors")
+os.environ["RAG_CHUNK_CACHE_PATH"] = os.path.join(_tmp, "chunks.sqlite3")
+os.environ["RAG_QUERY_CACHE_REDIS"] = "false"
+os.environ.pop("EMBEDDING_SERVER_URL", None)
+
+from app import rag as kb  # noqa: E402
+from app.services.rag_service import rag  # noqa: E402
+from app.services.vector_store import EMBEDDING_DIM  # noqa: E402
+
+TIMEOUT = 20
+
+
+class StubModel:
+    """Stands in for TextEmbedding: a fixed random unit vector per text."""
+
+    def embed(self, texts, batch_size=None):
+        for text in texts:
+            rng = np.random.default_rng(abs(hash(text)) % 2**32)
+            vec = rng.normal(size=EMBEDDING_DIM).astype(np.float32)
+            yield vec / np.linalg.norm(vec)
+
+
+def call(fn, *args):
+    # Daemon thread: a hang fails the test instead of blocking the run (and its exit)
+    outcome = {}
+
+    def target():
+        try:
+            outcome["value"] = fn(*args)
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    assert not thread.is_alive(), f"{getattr(fn, '__name__', fn)} did not return within {TIMEOUT}s"
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["value"]
+
+
+def test_retrieve_twice_in_one_process():
+    rag.embedder._model = StubModel()
+    text = "Design reviews use a two-approver rule\nOn-call rotates weekly"
+    stats = call(kb.run_sync, rag.ingest_document(text, metadata={"candidate_id": kb.KB_SCOPE}, doc_key="handbook"))
+    assert stats["chunks"] == 2
+
+    first = call(kb.retrieve, "Design reviews use a two-approver rule")
+    second = call(kb.retrieve, "On-call rotates weekly")
+
+    assert "two-approver" in first
+    assert "On-call" in second